@@ -4,8 +4,15 @@ from importlib.metadata import version
 __version__ = version("cat2cat")
 
 # simplified
-from cat2cat.cat2cat import cat2cat
+from cat2cat.cat2cat import (
+    cat2cat,
+    cat2cat_stream,
+    cat2cat_panel,
+    cat2cat_parallel,
+)
 
 from cat2cat.cat2cat_ml import cat2cat_ml_run
 
 from cat2cat.summary import summary_c2c
+
+from cat2cat.parquet import cat2cat_parquet
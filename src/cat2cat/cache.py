@@ -0,0 +1,308 @@
+import os
+import pickle
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from typing import Any, Dict, Hashable, Iterable, Optional, Union
+
+from numpy import empty, ndarray
+from pandas import DataFrame, Series
+from pandas.api.types import infer_dtype
+from pandas.util import hash_array
+
+__all__ = ["MappingsCache", "mappings_cache", "ModelCache"]
+
+
+class MappingsCache:
+    """In-process LRU cache of compiled mappings and applied frequencies
+
+    Entries are keyed by a content hash (fingerprint) of the transition table and of the frequencies,
+    so repeated `cat2cat` calls with the same `cat2cat_mappings.trans` skip the compile step.
+    Cached objects are shared between calls and should be treated as read-only.
+
+    Args:
+        maxsize (int): maximum number of cached entries, 0 turns the cache off. By default 128.
+
+    >>> from cat2cat.cache import mappings_cache
+    >>> mappings_cache.clear()
+    >>> mappings_cache.stats()
+    {'hits': 0, 'misses': 0, 'entries': 0, 'maxsize': 128}
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.maxsize = maxsize
+
+    @property
+    def maxsize(self) -> int:
+        """Maximum number of cached entries, setting a lower value evicts the oldest ones."""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int) -> None:
+        if not isinstance(value, int) or value < 0:
+            raise ValueError("maxsize has to be a non-negative int")
+        with self._lock:
+            self._maxsize = value
+            self._evict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached object or None, marking it as the most recently used."""
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache an object, evicting the least recently used ones if needed."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Number of hits, misses, current entries and the maximum size."""
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                entries=len(self._data),
+                maxsize=self._maxsize,
+            )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evict(self) -> None:
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+
+mappings_cache = MappingsCache()
+
+
+class ModelCache:
+    """On-disk LRU cache of the models fitted for each mapping group by the cat2cat ML step
+
+    A model is keyed by a content hash of its training rows (features and the categorical variable),
+    the feature names, the model class, its `get_params()` and the scikit-learn version,
+    so later runs with the same `cat2cat_ml` configuration only predict.
+    Models are pickled to the directory, one file for each key, and the least recently used ones
+    are removed when the total size is above `max_bytes`.
+    The directory can be shared by worker threads and processes, each of them keeps its own statistics.
+    Only use directories written by trusted code, the files are unpickled.
+
+    Args:
+        path (str): cache directory, created if it does not exist.
+        max_bytes (int): maximum total size of the cached models. By default 1 GiB.
+
+    >>> import tempfile
+    >>> from cat2cat.cache import ModelCache
+    >>> cache = ModelCache(tempfile.mkdtemp())
+    >>> cache.stats()
+    {'hits': 0, 'misses': 0, 'entries': 0, 'bytes': 0, 'max_bytes': 1073741824}
+    """
+
+    suffix = ".model.pkl"
+
+    def __init__(self, path: str, max_bytes: int = 2**30) -> None:
+        if not isinstance(path, str):
+            raise TypeError("path has to be a str")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        # file sizes in the least recently used order, read from the directory once
+        self._sizes: Optional["OrderedDict[str, int]"] = None
+        self.max_bytes = max_bytes
+
+    @property
+    def max_bytes(self) -> int:
+        """Maximum total size of the cached models, setting a lower value evicts the oldest ones."""
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int) -> None:
+        if not isinstance(value, int) or value < 0:
+            raise ValueError("max_bytes has to be a non-negative int")
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+    def key(self, X: DataFrame, y: Series, model: Any) -> str:
+        """Fingerprint of a model fitted on X and y."""
+        from sklearn import __version__ as sklearn_version
+
+        h = blake2b(digest_size=16)
+        h.update(sklearn_version.encode())
+        h.update("{}.{}".format(type(model).__module__, type(model).__qualname__).encode())
+        h.update(repr(sorted(model.get_params(deep=True).items())).encode())
+        h.update(repr(list(X.columns)).encode())
+        for name in X.columns:
+            h.update(_hash_values(X[name].to_numpy()))
+        h.update(_hash_values(y.to_numpy()))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a fitted model or None, marking it as the most recently used."""
+        file = os.path.join(self.path, key + self.suffix)
+        try:
+            with open(file, "rb") as f:
+                model = pickle.load(f)
+            os.utime(file)
+        except Exception:
+            # a missing, evicted or unreadable file is a miss
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            sizes = self._load_sizes()
+            if key in sizes:
+                sizes.move_to_end(key)
+        return model
+
+    def put(self, key: str, model: Any) -> None:
+        """Cache a fitted model, evicting the least recently used ones if needed.
+
+        Errors of the file system, like a full disk or a file evicted by another process, are ignored.
+        """
+        file = os.path.join(self.path, key + self.suffix)
+        tmp = "{}.{}.{}.tmp".format(file, os.getpid(), id(model))
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            # readers never see a partially written file
+            os.replace(tmp, file)
+        except OSError:
+            _remove(tmp)
+            return
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[key] = size
+            sizes.move_to_end(key)
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove all cached models and reset the statistics."""
+        with self._lock:
+            for key in self._load_sizes():
+                _remove(os.path.join(self.path, key + self.suffix))
+            self._sizes = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Number of hits, misses, cached models, their total size and the maximum size."""
+        with self._lock:
+            sizes = self._load_sizes()
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                entries=len(sizes),
+                bytes=sum(sizes.values()),
+                max_bytes=self._max_bytes,
+            )
+
+    def __len__(self) -> int:
+        return self.stats()["entries"]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # workers get the directory and the limits, not the lock
+        state = self.__dict__.copy()
+        state.update(_lock=None, _sizes=None, hits=0, misses=0)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def _load_sizes(self) -> "OrderedDict[str, int]":
+        if self._sizes is None:
+            entries = []
+            with os.scandir(self.path) as it:
+                for e in it:
+                    if e.name.endswith(self.suffix):
+                        try:
+                            stat = e.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, e.name[: -len(self.suffix)], stat.st_size))
+            self._sizes = OrderedDict((key, size) for _, key, size in sorted(entries))
+        return self._sizes
+
+    def _evict(self) -> None:
+        sizes = self._load_sizes()
+        total = sum(sizes.values())
+        while total > self._max_bytes and sizes:
+            key, size = sizes.popitem(last=False)
+            _remove(os.path.join(self.path, key + self.suffix))
+            total -= size
+
+
+def fingerprint_table(x: Any) -> str:
+    """Content hash of a 2 column transition table (DataFrame or ndarray)."""
+    h = blake2b(digest_size=16)
+    if isinstance(x, DataFrame):
+        columns = [x.iloc[:, i].to_numpy() for i in range(x.shape[1])]
+    else:
+        columns = [x[:, i] for i in range(x.shape[1])]
+    for col in columns:
+        h.update(str(col.dtype).encode())
+        h.update(_hash_values(col))
+    return h.hexdigest()
+
+
+def fingerprint_freqs(x: Union[Dict[Any, Any], ndarray]) -> str:
+    """Content hash of frequencies, a dict like the one returned by `get_freqs` or an array."""
+    h = blake2b(digest_size=16)
+    if isinstance(x, dict):
+        h.update(_hash_values(_object_array(x.keys())))
+        h.update(_hash_values(_object_array(x.values())))
+    else:
+        h.update(b"array")
+        h.update(_hash_values(x))
+    return h.hexdigest()
+
+
+def _object_array(values: Iterable[Any]) -> ndarray:
+    values = list(values)
+    res = empty(len(values), dtype=object)
+    res[:] = values
+    return res
+
+
+def _hash_values(values: ndarray) -> bytes:
+    # the inferred type is a part of the hash so 1, 1.0 and "1" are not mixed up
+    kind = infer_dtype(values, skipna=False).encode()
+    if values.dtype.kind in "US":
+        # fixed width strings are not supported by hash_array
+        values = values.astype(object)
+    res = kind + hash_array(values, categorize=False).tobytes()
+    if values.dtype == object:
+        # object values are hashed as str, the type of each element keeps "1" and 1 apart
+        types = _object_array(type(e).__qualname__ for e in values)
+        res += hash_array(types, categorize=False).tobytes()
+    return res
+
+
+def _remove(file: str) -> None:
+    try:
+        os.remove(file)
+    except FileNotFoundError:
+        pass
@@ -1,23 +1,70 @@
-from pandas import DataFrame, concat
-import pandas as pd
-from numpy import arange, repeat, setdiff1d, isin, intersect1d
+from pandas import (
+    Categorical,
+    CategoricalDtype,
+    DataFrame,
+    Index,
+    RangeIndex,
+    concat,
+    factorize,
+)
+from pandas.api.types import infer_dtype
+from numpy import (
+    arange,
+    bincount,
+    concatenate,
+    cumsum,
+    empty,
+    flatnonzero,
+    int64,
+    ndarray,
+    ones,
+    repeat,
+    where,
+)
 
-from cat2cat.mappings import get_mappings, get_freqs, cat_apply_freq
-from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+from cat2cat.mappings import (
+    MappingIndex,
+    Table,
+    _direction_index,
+    candidate_probs,
+    compose_mappings,
+    get_freqs,
+)
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml, cat2cat_spill
 from cat2cat.cat2cat_utils import dummy_c2c
 from cat2cat.cat2cat_ml import _cat2cat_ml
+from cat2cat.expanded import cat2cat_expanded
+from cat2cat.sparse import cat2cat_sparse
+from cat2cat.spill import _spill_expanded
 
-from typing import Optional, Any, Dict
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    Optional,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 
-# include_groups parameter added in pandas 2.2.0
-_PANDAS_HAS_INCLUDE_GROUPS = tuple(int(x) for x in pd.__version__.split('.')[:2]) >= (2, 2)
-
-__all__ = ["cat2cat"]
+__all__ = ["cat2cat", "cat2cat_stream", "cat2cat_panel", "cat2cat_parallel"]
 
 
 def cat2cat(
-    data: cat2cat_data, mappings: cat2cat_mappings, ml: Optional[cat2cat_ml] = None
-) -> Dict[str, DataFrame]:
+    data: cat2cat_data,
+    mappings: cat2cat_mappings,
+    ml: Optional[cat2cat_ml] = None,
+    categorical: bool = False,
+    output: str = "frame",
+    copy: bool = True,
+    spill: Optional[cat2cat_spill] = None,
+) -> Dict[str, Any]:
     """Automatic mapping in a panel dataset - cat2cat procedure
 
     Args:
@@ -27,6 +74,22 @@ def cat2cat(
             Please check out the `cat2cat.dataclass.cat2cat_mappings` for more information.
         ml (Optional[cat2cat_ml]): dataclass with ml related arguments.
             Please check out the `cat2cat.dataclass.cat2cat_ml` for more information.
+        categorical (bool): if True the g_new_c2c column is a `pandas.Categorical` with one dictionary shared by both periods.
+            Categories are integer coded once and only the dictionary holds the labels,
+            which saves the memory and time for string categories. By default False.
+        output (str): "frame" returns the replicated target period as a DataFrame.
+            "lazy" returns a `cat2cat.expanded.cat2cat_expanded` object instead, which replicates only the accessed columns.
+            "sparse" returns a `cat2cat.sparse.cat2cat_sparse` object, the target period is not replicated
+            and each weight is an (observations x categories) `scipy.sparse` CSR matrix.
+            By default "frame".
+        copy (bool): if False the base period frame is not copied, its cat2cat columns are added to a shallow copy
+            which shares the data of the other columns with `data.old` or `data.new`.
+            The caller frame does not get new columns, but later in place changes of it can be seen in the result.
+            By default True.
+        spill (Optional[cat2cat_spill]): dataclass with spill related arguments, if provided the replicated target period
+            is written to memory-mapped files in a scratch directory and the returned frame is backed by them.
+            Please check out the `cat2cat.dataclass.cat2cat_spill` for more information.
+            The same as for `output="lazy"`, one-hot encoded ml features are not added to the frame. By default None.
 
     Returns:
         dict: with 2 DataFrames, old and new.
@@ -47,8 +110,14 @@ def cat2cat(
         It is recommended to use string or float types in the mapping table and for categorical variable.
         Alternative solution can be representing missing values as a specific number (9999) or string ("Missing").
 
+        4. Without ml models the replicated target period is allocated once, with one take of its rows,
+        including the observations matched directly with `data.id_var`.
+        With `copy=False` the peak memory is about the input frames, plus the output target frame,
+        plus around 48 bytes per output row for the temporary replication arrays (row positions, candidate codes and weights).
+        The base period adds only its cat2cat columns.
+
     >>> from cat2cat import cat2cat
-    >>> from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+    >>> from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml, cat2cat_spill
     >>> from sklearn.ensemble import RandomForestClassifier
     >>> from cat2cat.datasets import load_trans, load_occup
     >>> trans = load_trans()
@@ -62,15 +131,418 @@ def cat2cat(
     {...
 
     """
+    _check_args(data, mappings, ml, categorical)
+    if output not in ("frame", "lazy", "sparse"):
+        raise ValueError('output arg has to be one of "frame", "lazy" or "sparse"')
+    if not isinstance(copy, bool):
+        raise TypeError("copy arg has to be a bool")
+    if spill is not None and not isinstance(spill, cat2cat_spill):
+        raise TypeError("spill arg has to be cat2cat_spill instance or None")
+    if spill is not None and output != "frame":
+        raise ValueError('spill arg works only with output="frame"')
+
+    plan = _prepare(data, mappings, ml, categorical, copy)
+    # Final
+    res: Dict[str, Any] = dict()
+    target = getattr(data, plan.target_name)
+    if spill is not None:
+        expanded = _expand(plan, target, output="lazy")
+        res[plan.target_name] = _spill_expanded(
+            expanded, spill.path, spill.keep, spill.chunksize
+        )
+    else:
+        res[plan.target_name] = _expand(plan, target, output=output)
+    res[plan.base_name] = plan.base_df
+
+    return res
+
+
+def cat2cat_stream(
+    data: cat2cat_data,
+    mappings: cat2cat_mappings,
+    chunks: Iterable[DataFrame],
+    ml: Optional[cat2cat_ml] = None,
+    categorical: bool = False,
+) -> Iterator[Tuple[str, DataFrame]]:
+    """Chunked cat2cat procedure for a target period larger than memory
+
+    The compiled mapping, the base period frequencies and the shared categorical dictionary are computed once,
+    then each chunk of the target period is replicated on its own and yielded.
+    `index_c2c` is the position of an observation in the whole target period, so it is unique across chunks.
+
+    Args:
+        data (cat2cat_data): dataclass with data related arguments.
+            The target period frame is not used, as the target period is given by the chunks argument,
+            e.g. the first chunk could be provided.
+        mappings (cat2cat_mappings): dataclass with mappings related arguments.
+        chunks (Iterable[DataFrame]): chunks of the target period, e.g. from `pandas.read_csv(..., chunksize=)`.
+        ml (Optional[cat2cat_ml]): dataclass with ml related arguments. Models are fitted for each chunk.
+        categorical (bool): the same as in `cat2cat`, the dictionary is shared by all chunks. By default False.
+
+    Returns:
+        Iterator[Tuple[str, DataFrame]]: the base period ("old" or "new") and its DataFrame first,
+        then the target period name and a DataFrame for each chunk.
+        Concatenated chunks are the same as the target period from `cat2cat` for the concatenated input,
+        except direct matches (`data.id_var`) which are placed at the end of each chunk.
+
+    >>> from cat2cat.cat2cat import cat2cat_stream
+    >>> from cat2cat.dataclass import cat2cat_data, cat2cat_mappings
+    >>> from cat2cat.datasets import load_trans, load_occup
+    >>> occup = load_occup()
+    >>> o_old = occup.loc[occup.year == 2008, :]
+    >>> o_new = occup.loc[occup.year == 2010, :]
+    >>> data = cat2cat_data(o_old.iloc[:1000], o_new, "code", "code", "year")
+    >>> chunks = (o_old.iloc[i : i + 1000] for i in range(0, len(o_old), 1000))
+    >>> stream = cat2cat_stream(data, cat2cat_mappings(load_trans(), "backward"), chunks)
+    >>> [period for period, _ in stream][:3]
+    ['new', 'old', 'old']
+    """
+    _check_args(data, mappings, ml, categorical)
+    if not isinstance(chunks, Iterable) or isinstance(chunks, DataFrame):
+        raise TypeError("chunks arg has to be an Iterable of DataFrames")
+    plan = _prepare(data, mappings, ml, categorical)
+    return _stream(plan, chunks)
+
+
+def cat2cat_panel(
+    data: DataFrame,
+    cat_var: str,
+    time_var: str,
+    trans: Union[Table, Sequence[Table]],
+    breaks: Union[Any, Sequence[Any]],
+    direction: str,
+    id_var: Optional[str] = None,
+    multiplier_var: Optional[str] = None,
+    ml: Optional[cat2cat_ml] = None,
+    categorical: bool = False,
+    n_jobs: int = 1,
+) -> Dict[Any, DataFrame]:
+    """cat2cat procedure for all waves of a long panel in one call
+
+    Periods are split into coding regimes by the breaks, the first period of each new coding.
+    All periods are mapped to the coding of the last regime ("backward") or of the first one ("forward").
+    The base period is the one next to the coding change, the first period of the last regime for "backward"
+    and the last period of the first regime for "forward". Periods of the base regime get only the default cat2cat columns.
+
+    The mapping, the base period frequencies and the categorical dictionary are computed once per regime
+    and shared by all its periods. For regimes more than one coding change away the transition tables
+    are composed with `cat2cat.mappings.compose_mappings`, with frequencies of each intermediate coding
+    taken from its period next to the coding change.
+
+    Args:
+        data (DataFrame): long panel with all periods.
+        cat_var (str): name of the categorical variable, in the coding of its period.
+        time_var (str): name of the time variable, its values have to be sortable.
+        trans (Union[Table, Sequence[Table]]): transition tables between consecutive codings, from the oldest one.
+        breaks (Union[Any, Sequence[Any]]): the first period of each new coding, one for each transition table.
+        direction (str): "backward" or "forward", the same as in `cat2cat.dataclass.cat2cat_mappings`.
+        id_var (Optional[str]): name of the identifier variable, subjects observed in the base period are mapped directly.
+            Defaults to None.
+        multiplier_var (Optional[str]): name of the multiplier variable. Defaults to None.
+        ml (Optional[cat2cat_ml]): dataclass with ml related arguments, `ml.cat_var` in the base coding.
+            Defaults to None.
+        categorical (bool): the same as in `cat2cat`, one dictionary is shared by all periods. By default False.
+        n_jobs (int): number of threads, periods are independent once the mappings are prepared. Defaults to 1.
+
+    Returns:
+        dict: a DataFrame for each period, sorted by period, the same as from `cat2cat` for the period and the base period.
+
+    >>> from cat2cat import cat2cat_panel
+    >>> from cat2cat.datasets import load_trans, load_occup_panel
+    >>> panel = load_occup_panel()
+    >>> # the same type of codes as in the transition table
+    >>> panel["code"] = panel["code"].astype(str)
+    >>> res = cat2cat_panel(panel, "code", "quarter", load_trans(), "2010Q1", "backward", id_var="panel_id")
+    >>> list(res.keys())
+    ['2009Q1', '2009Q2', '2009Q3', '2009Q4', '2010Q1', '2010Q2', '2010Q3', '2010Q4']
+    >>> # the observations of the older coding are replicated, their weights sum to one
+    >>> counts = panel.groupby("quarter").size()
+    >>> bool(len(res["2009Q1"]) > counts["2009Q1"])
+    True
+    >>> all(round(df["wei_freq_c2c"].sum()) == counts[period] for period, df in res.items())
+    True
+    """
+    if not isinstance(data, DataFrame):
+        raise TypeError("data arg has to be a pandas.DataFrame")
+    if not isinstance(cat_var, str) or cat_var not in data.columns:
+        raise ValueError("cat_var has to be a str and the data column")
+    if not isinstance(time_var, str) or time_var not in data.columns:
+        raise ValueError("time_var has to be a str and the data column")
+    if isinstance(trans, (DataFrame, ndarray)):
+        trans = [trans]
+    # cat2cat_mappings takes a DataFrame
+    trans = [DataFrame(t) if isinstance(t, ndarray) else t for t in trans]
+    if isinstance(breaks, str) or not isinstance(breaks, Sequence):
+        breaks = [breaks]
+    if len(trans) == 0 or len(trans) != len(breaks):
+        raise ValueError("breaks has to have one period for each transition table")
+    if list(breaks) != sorted(breaks):
+        raise ValueError("breaks have to be sorted")
+    if direction not in ("forward", "backward"):
+        raise ValueError('direction has to be one of "forward" or "backward"')
+    if not isinstance(n_jobs, int) or n_jobs < 1:
+        raise ValueError("n_jobs arg has to be a positive int")
+
+    waves = {period: df for period, df in data.groupby(time_var, sort=True)}
+    periods = list(waves.keys())
+    regimes: List[List[Any]] = [[] for _ in range(len(trans) + 1)]
+    for period in periods:
+        regimes[sum(period >= b for b in breaks)].append(period)
+    if any(len(r) == 0 for r in regimes):
+        raise ValueError("each coding regime has to have at least one period")
+
+    backward = direction == "backward"
+    base_regime = len(trans) if backward else 0
+    base_period = regimes[-1][0] if backward else regimes[0][-1]
+
+    # a one plan for each regime, shared by its periods
+    plans: Dict[int, _cat2cat_plan] = dict()
+    for k, regime in enumerate(regimes):
+        if k == base_regime:
+            continue
+        steps = range(k, len(trans)) if backward else range(k)
+        mapping: Union[Table, MappingIndex]
+        if len(steps) == 1:
+            mapping = trans[steps[0]]
+        else:
+            # frequencies of the base coding of each table from its period next to the coding change
+            freqs = []
+            for j in steps:
+                wave = waves[regimes[j + 1][0] if backward else regimes[j][-1]]
+                multiplier = wave[multiplier_var] if multiplier_var in wave else None
+                freqs.append(get_freqs(wave[cat_var].values, multiplier))
+            mapping = compose_mappings([trans[j] for j in steps], direction, freqs)
+        target = waves[regime[0]]
+        old, new = (target, waves[base_period]) if backward else (waves[base_period], target)
+        data_k = cat2cat_data(old, new, cat_var, cat_var, time_var, id_var, multiplier_var)
+        mappings_k = cat2cat_mappings(mapping, direction)
+        _check_args(data_k, mappings_k, ml, categorical)
+        plans[k] = _prepare(data_k, mappings_k, ml, categorical)
+
+    if categorical:
+        # the other periods of the base regime could have categories not seen in the base period
+        values = [
+            e
+            for period in regimes[base_regime]
+            if period != base_period
+            for e in waves[period][cat_var].dropna().unique().tolist()
+        ]
+        _share_dictionary(list(plans.values()), values)
+
+    def run(k: int, period: Any) -> DataFrame:
+        plan = plans[k] if k != base_regime else next(iter(plans.values()))
+        if period == base_period:
+            return plan.base_df
+        if k == base_regime:
+            return _dummy_base(plan, waves[period])
+        return _expand(plan, waves[period])
+
+    jobs = [(k, period) for k, regime in enumerate(regimes) for period in regime]
+    if n_jobs == 1:
+        res = [run(k, period) for k, period in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            res = list(executor.map(lambda job: run(*job), jobs))
+
+    return {period: df for (_, period), df in zip(jobs, res)}
+
+
+def cat2cat_parallel(
+    data: cat2cat_data,
+    mappings: cat2cat_mappings,
+    ml: Optional[cat2cat_ml] = None,
+    categorical: bool = False,
+    by: Optional[str] = None,
+    chunksize: Optional[int] = None,
+    n_jobs: Optional[int] = None,
+    mp_context: Optional[Any] = None,
+) -> Dict[str, DataFrame]:
+    """cat2cat procedure with the target period split into parts run in a process pool
+
+    The mapping, the base period frequencies and the categorical dictionary are prepared once
+    and sent to each worker process once, when it starts (inherited without pickling with the "fork" start method).
+    The target period is split by the values of the by column, or into row chunks,
+    and the replication and the ml weighting of the parts run in parallel.
+
+    Args:
+        data (cat2cat_data): dataclass with data related arguments.
+        mappings (cat2cat_mappings): dataclass with mappings related arguments.
+        ml (Optional[cat2cat_ml]): dataclass with ml related arguments. Defaults to None.
+        categorical (bool): the same as in `cat2cat`. By default False.
+        by (Optional[str]): a target period column, each of its values is a separate part, e.g. a region.
+            Defaults to None, row chunks, or with ml whole categories of the target period in n_jobs parts.
+        chunksize (Optional[int]): number of target period rows in a chunk when by is None.
+            Defaults to None, one chunk for each worker.
+        n_jobs (Optional[int]): number of worker processes. Defaults to None, the number of CPUs.
+        mp_context (Optional[Any]): a `multiprocessing` context for the `concurrent.futures.ProcessPoolExecutor`.
+            Defaults to None, the default start method.
+
+    Returns:
+        dict: with 2 DataFrames, old and new, the same as from `cat2cat`.
+        `index_c2c` is the position of an observation in the whole target period and the rows are in the `cat2cat` order.
+
+    Note:
+        The ml models are fitted for each target category of each part, so with ml the default split
+        keeps every target category in one part and each model is fitted once.
+        A split with the by or chunksize argument fits the models of a category in each part where it is present.
+        With categorical (one-hot encoded) features the encoded levels are taken
+        from the training data and each part, so they could differ from a single `cat2cat` run.
+    """
+    _check_args(data, mappings, ml, categorical)
+    target_df = data.old if mappings.direction == "backward" else data.new
+    if by is not None and (not isinstance(by, str) or by not in target_df.columns):
+        raise ValueError("by arg has to be a str and a target period column, or None")
+    if chunksize is not None and (not isinstance(chunksize, int) or chunksize < 1):
+        raise ValueError("chunksize arg has to be a positive int or None")
+    if n_jobs is not None and (not isinstance(n_jobs, int) or n_jobs < 1):
+        raise ValueError("n_jobs arg has to be a positive int or None")
+
+    plan = _prepare(data, mappings, ml, categorical)
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    # positions of the target period observations in each part
+    parts: List[ndarray]
+    sort = True
+    if by is not None:
+        parts = list(target_df.groupby(by, sort=False, dropna=False).indices.values())
+    elif chunksize is None and ml is not None:
+        # a model is fitted for each target category, so a category is kept in one part
+        groups = target_df.groupby(plan.cat_var_target, sort=False, dropna=False).indices
+        parts = _balance(list(groups.values()), n_jobs)
+    else:
+        sort = False
+        size = chunksize or max(-(-target_df.shape[0] // n_jobs), 1)
+        parts = [
+            arange(i, min(i + size, target_df.shape[0]))
+            for i in range(0, target_df.shape[0], size)
+        ]
+    parts = parts or [arange(0)]
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(plan,),
+    ) as executor:
+        results = list(
+            executor.map(_run_part, [target_df.take(pos) for pos in parts], parts)
+        )
+
+    # replicated rows first and then the direct matches, both ordered by index_c2c
+    res: Dict[str, Any] = dict()
+    replicated = _concat_rows([r for r, _ in results], ignore_index=True)
+    if sort:
+        replicated = _sort_stable(replicated).reset_index(drop=True)
+    if plan.direct_ids is not None:
+        direct = _concat_rows([d for _, d in results])
+        direct = _sort_stable(direct) if sort else direct
+        res[plan.target_name] = _concat_rows([replicated, direct])
+    else:
+        res[plan.target_name] = replicated
+    res[plan.base_name] = plan.base_df
+    return res
+
+
+_worker_plan: Optional["_cat2cat_plan"] = None
+
+
+def _init_worker(plan: "_cat2cat_plan") -> None:
+    global _worker_plan
+    _worker_plan = plan
+
+
+def _run_part(part: DataFrame, positions: ndarray) -> Tuple[DataFrame, DataFrame]:
+    """Replicate a part of the target period in a worker, the replicated and the directly matched rows"""
+    plan = _worker_plan
+    assert plan is not None
+    res = cast(DataFrame, _expand(plan, part, positions=positions))
+    n_direct = 0
+    if plan.direct_ids is not None:
+        n_direct = int((plan.direct_ids.get_indexer(part[plan.id_var]) >= 0).sum())
+    n_rep = res.shape[0] - n_direct
+    return res.iloc[:n_rep], res.iloc[n_rep:]
+
+
+def _concat_rows(frames: List[DataFrame], **kwargs: Any) -> DataFrame:
+    """concat skipping the empty frames, their columns could widen the dtypes to object"""
+    return concat([df for df in frames if len(df)] or frames[:1], **kwargs)
+
+
+def _sort_stable(df: DataFrame) -> DataFrame:
+    return df.take(df["index_c2c"].to_numpy().argsort(kind="stable"))
+
+
+def _balance(groups: List[ndarray], n: int) -> List[ndarray]:
+    """Positions of groups assigned to at most n parts with similar sizes, the largest groups first"""
+    bins: List[List[ndarray]] = [[] for _ in range(min(n, len(groups)))]
+    sizes = [0] * len(bins)
+    for group in sorted(groups, key=len, reverse=True):
+        i = sizes.index(min(sizes))
+        bins[i].append(group)
+        sizes[i] += len(group)
+    return [concatenate(b) for b in bins]
+
+
+def _stream(
+    plan: "_cat2cat_plan", chunks: Iterable[DataFrame]
+) -> Iterator[Tuple[str, DataFrame]]:
+    yield plan.base_name, plan.base_df
+    offset = 0
+    for chunk in chunks:
+        if not isinstance(chunk, DataFrame):
+            raise TypeError("chunks arg has to be an Iterable of DataFrames")
+        target = _expand(plan, chunk, offset)
+        offset += len(chunk)
+        yield plan.target_name, target
+
+
+def _check_args(
+    data: cat2cat_data,
+    mappings: cat2cat_mappings,
+    ml: Optional[cat2cat_ml],
+    categorical: bool,
+) -> None:
     if not isinstance(data, cat2cat_data):
         raise TypeError("data arg has to be cat2cat_data instance")
     if not isinstance(mappings, cat2cat_mappings):
         raise TypeError("mappings arg has to be cat2cat_mappings instance")
     if ml is not None and not isinstance(ml, cat2cat_ml):
         raise TypeError("ml arg has to be cat2cat_ml instance")
+    if not isinstance(categorical, bool):
+        raise TypeError("categorical arg has to be a bool")
+
 
-    mapps = get_mappings(mappings.trans)
+@dataclass
+class _cat2cat_plan:
+    """Everything computed once from the mappings and the base period"""
 
+    target_name: str
+    base_name: str
+    cat_var_target: str
+    cat_var_base: str
+    mapp: MappingIndex
+    probs: ndarray
+    base_df: DataFrame
+    id_var: Optional[str] = None
+    direct_ids: Optional[Index] = None
+    direct_values: Optional[ndarray] = None
+    dtype: Optional[CategoricalDtype] = None
+    dict_codes: Optional[ndarray] = None
+    ml: Optional[cat2cat_ml] = None
+    ml_names: List[str] = field(default_factory=list)
+
+
+def _prepare(
+    data: cat2cat_data,
+    mappings: cat2cat_mappings,
+    ml: Optional[cat2cat_ml],
+    categorical: bool,
+    copy: bool = True,
+) -> _cat2cat_plan:
+    """Compile the mapping, resolve the base period frequencies and add its cat2cat columns
+
+    With copy=False the cat2cat columns are added to a shallow copy of the base period frame.
+    """
     if mappings.direction == "forward":
         target_name = "new"
         base_name = "old"
@@ -80,95 +552,396 @@ def cat2cat(
 
     cat_var_base = getattr(data, "cat_var_" + base_name)
     cat_var_target = getattr(data, "cat_var_" + target_name)
-    base_df = getattr(data, base_name).copy()
-    target_df = getattr(data, target_name).copy()
-    mid_df = DataFrame()
-    mapp = mapps["to_" + base_name]
+    base_df = getattr(data, base_name).copy(deep=copy)
+    mapp = _direction_index(mappings.trans, mappings.direction)
 
-    is_direct = not data.id_var is None
-    if is_direct:
-        id_inner = intersect1d(base_df[data.id_var], target_df[data.id_var])
-        id_outer = setdiff1d(target_df[data.id_var], base_df[data.id_var])
-        mid_df = dummy_c2c(
-            target_df.loc[target_df[data.id_var].isin(id_inner), :].copy(),
-            cat_var_base,
-        )
-        target_df = target_df.loc[target_df[data.id_var].isin(id_outer)].copy()
-
-        tos = data.old.loc[:, [data.id_var, data.cat_var_old]].merge(
-            data.new.loc[:, [data.id_var, data.cat_var_new]], on=data.id_var
-        )
-        tos.columns = ["id", "cat_old", "cat_new"]
-        tos_dict = dict(zip(tos["id"], tos["cat_" + base_name]))
-        mid_df["g_new_c2c"] = [tos_dict.get(e) for e in mid_df[data.id_var]]
+    # base period categories coded against the mapping candidates
+    base_codes: Optional[ndarray] = None
+    if categorical or (mappings.freqs is None and mapp.weights is None):
+        base_codes = mapp.get_category_indexer(base_df[cat_var_base])
 
-    # frequencies
-    freqs: Dict[Any, int]
+    # frequencies per category
+    probs: ndarray
     if isinstance(mappings.freqs, dict):
-        freqs = mappings.freqs
+        probs = candidate_probs(mapp, mappings.freqs)
+    elif mapp.weights is not None:
+        # combined probabilities of a composed mapping
+        probs = mapp.weights
     else:
-        freqs = _resolve_frequencies(base_df, cat_var_base, data.multiplier_var)
-
-    # frequencies per category
-    mapp_f = cat_apply_freq(mapp, freqs)
-
-    # mappings and frequencies per obs
-    a_mapp = [mapp.get(e, []) for e in target_df[cat_var_target]]
-    a_mapp_f = [mapp_f.get(e, []) for e in target_df[cat_var_target]]
-    lens = [len(e) for e in a_mapp]
-    nrow_target = target_df.shape[0]
-
-    # target_df
-    # index cat2cat
-    target_df = target_df.assign(index_c2c=arange(nrow_target))
-    # replication process
-    target_df = target_df.iloc[repeat(arange(nrow_target), lens), :]
-    # remove duplicates in the index
-    target_df = target_df.reset_index(drop=True)
-    # cat2cat columns
-    target_df["g_new_c2c"] = [e for l in a_mapp for e in l]
-    target_df["rep_c2c"] = repeat(lens, lens)
-    target_df["wei_naive_c2c"] = 1 / target_df.rep_c2c
-    target_df["wei_freq_c2c"] = [e for l in a_mapp_f for e in l]
+        freqs = _resolve_frequencies(
+            base_df, cat_var_base, data.multiplier_var, mapp.categories, base_codes
+        )
+        probs = candidate_probs(mapp, freqs)
 
     # base_df
-    base_df = dummy_c2c(base_df, cat_var_base)
+    base_has_g = "g_new_c2c" in base_df.columns and cat_var_base != "g_new_c2c"
+    base_df = dummy_c2c(base_df, cat_var_base, inplace=True)
+    plan = _cat2cat_plan(
+        target_name=target_name,
+        base_name=base_name,
+        cat_var_target=cat_var_target,
+        cat_var_base=cat_var_base,
+        mapp=mapp,
+        probs=probs,
+        base_df=base_df,
+        ml=ml,
+    )
+
+    if categorical:
+        # a one dictionary for all periods, so the columns can be concatenated
+        base_g = base_df["g_new_c2c"].to_numpy()
+        if base_has_g:
+            base_codes = mapp.get_category_indexer(base_g)
+        assert base_codes is not None
+        plan.dtype, plan.dict_codes, base_g_codes = _categorical_dictionary(
+            mapp.categories, base_codes, base_g
+        )
+        base_df["g_new_c2c"] = Categorical.from_codes(base_g_codes, dtype=plan.dtype)
+
+    if data.id_var is not None:
+        # the base category of each subject, the last one for duplicated ids
+        base_ids = base_df[data.id_var]
+        keep = (~base_ids.duplicated(keep="last") & base_ids.notna()).to_numpy()
+        plan.id_var = data.id_var
+        plan.direct_ids = Index(base_ids.to_numpy()[keep])
+        plan.direct_values = base_df[cat_var_base].to_numpy()[keep]
+        if plan.dtype is not None:
+            plan.direct_values = Categorical(plan.direct_values, dtype=plan.dtype).codes
 
-    # ML
     if ml is not None:
         for m in ml.models:
-            ml_name = type(m).__name__
-            ml_colname = "wei_" + ml_name + "_c2c"
-            target_df[ml_colname] = target_df["wei_freq_c2c"]
+            ml_colname = "wei_" + type(m).__name__ + "_c2c"
+            plan.ml_names.append(ml_colname)
             base_df[ml_colname] = 1
-            if is_direct:
-                mid_df[ml_colname] = 1
 
-        _cat2cat_ml(ml, mapp, target_df, cat_var_target)
+    return plan
 
-    # Final
-    res = dict()
-    res[target_name] = concat([target_df, mid_df])
-    res[base_name] = base_df
 
-    return res
+def _expand(
+    plan: _cat2cat_plan,
+    target_df: DataFrame,
+    offset: int = 0,
+    output: str = "frame",
+    positions: Optional[ndarray] = None,
+) -> Union[DataFrame, cat2cat_expanded, cat2cat_sparse]:
+    """Replicate (a chunk of) the target period
+
+    The observations matched directly with the id_var are placed after the replicated ones.
+    `index_c2c` is the position of an observation in the target period, starting from offset,
+    or given by positions for a part which is not a contiguous chunk.
+    Without ml models the output frame is allocated once, with one take of the target rows.
+    With output="sparse" nothing is replicated, only the weights are returned as sparse matrices.
+    """
+    mapp = plan.mapp
+    if positions is None:
+        index_c2c = arange(offset, offset + target_df.shape[0])
+    else:
+        index_c2c = positions
+    outer = arange(target_df.shape[0])
+    inner = outer[:0]
+
+    is_direct = plan.direct_ids is not None
+    direct_pos = inner
+    if plan.direct_ids is not None:
+        # one hash lookup of the target ids in the base ones
+        direct_pos = plan.direct_ids.get_indexer(target_df[plan.id_var])
+        is_inner = direct_pos >= 0
+        inner, outer = flatnonzero(is_inner), flatnonzero(~is_inner)
+        direct_pos = direct_pos.take(inner)
+
+    # mappings and frequencies per obs, candidates as integer codes
+    codes = mapp.get_indexer(target_df[plan.cat_var_target]).take(outer)
+    lens, g_codes, g_probs = _replicate(mapp, codes, plan.probs)
+    # position in target_df of each replicated row
+    rows = repeat(outer, lens)
+
+    # cat2cat columns, labels are decoded only here
+    g_new: Any
+    if plan.dtype is not None:
+        assert plan.dict_codes is not None
+        g_new = Categorical.from_codes(plan.dict_codes.take(g_codes), dtype=plan.dtype)
+    elif infer_dtype(mapp.categories, skipna=True) == "string":
+        # an object array of labels gives the same column as a list, without the list
+        g_new = mapp.categories.take(g_codes)
+    else:
+        g_new = mapp.categories.take(g_codes).tolist()
+    rep = repeat(lens, lens)
+    c2c = dict(
+        index_c2c=index_c2c.take(rows),
+        g_new_c2c=g_new,
+        rep_c2c=rep,
+        wei_naive_c2c=1 / rep,
+        wei_freq_c2c=g_probs,
+    )
+    if output == "sparse":
+        del g_new, rep, g_probs
+        return _sparse(plan, target_df, rows, g_codes, c2c, inner, direct_pos, index_c2c)
+    del g_new, rep, g_probs, g_codes
+    mid = (
+        _direct_c2c(plan, target_df, inner, direct_pos, index_c2c)
+        if is_direct
+        else dict()
+    )
+
+    if output != "lazy" and plan.ml is None:
+        # the replicated and the directly matched rows in one take
+        res = target_df.take(concatenate([rows, inner]))
+        res.index = (
+            RangeIndex(len(rows)).append(target_df.index.take(inner))
+            if is_direct
+            else RangeIndex(len(rows))
+        )
+        del rows
+        # the temporary arrays are released one by one, as they are copied into the frame
+        for name in list(c2c.keys()):
+            values = c2c.pop(name)
+            res[name] = _append_values(values, mid.pop(name)) if is_direct else values
+            del values
+        return res
+
+    mid_df: Optional[DataFrame] = None
+    if is_direct:
+        mid_df = target_df.take(inner)
+        for name, values in mid.items():
+            mid_df[name] = values
+
+    if output == "lazy":
+        expanded = cat2cat_expanded(target_df, rows, DataFrame(c2c), mid_df)
+        _expanded_ml(plan, expanded)
+        return expanded
+
+    # replication process, remove duplicates in the index
+    target_df = target_df.take(rows).reset_index(drop=True)
+    for name, values in c2c.items():
+        target_df[name] = values
+    for ml_colname in plan.ml_names:
+        target_df[ml_colname] = target_df["wei_freq_c2c"]
+    assert plan.ml is not None
+    _cat2cat_ml(plan.ml, mapp, target_df, plan.cat_var_target)
+    return _concat_rows([target_df, mid_df]) if mid_df is not None else target_df
+
+
+def _expanded_ml(plan: _cat2cat_plan, expanded: cat2cat_expanded) -> None:
+    """ml weights of the replicated rows, only the columns used by the models are replicated"""
+    if plan.ml is None:
+        return
+    for ml_colname in plan.ml_names:
+        expanded.c2c[ml_colname] = expanded.c2c["wei_freq_c2c"]
+    ml_cols = [plan.cat_var_target] + list(plan.ml.features)
+    ml_cols += list(expanded.c2c.columns)
+    ml_df = expanded._replicated(list(dict.fromkeys(ml_cols)))
+    _cat2cat_ml(plan.ml, plan.mapp, ml_df, plan.cat_var_target)
+    for ml_colname in plan.ml_names:
+        expanded.c2c[ml_colname] = ml_df[ml_colname].to_numpy()
+
+
+def _sparse(
+    plan: _cat2cat_plan,
+    target_df: DataFrame,
+    rows: ndarray,
+    g_codes: ndarray,
+    c2c: Dict[str, Any],
+    inner: ndarray,
+    direct_pos: ndarray,
+    index_c2c: ndarray,
+) -> cat2cat_sparse:
+    """Weights of the target period as (observations x categories) CSR matrices
+
+    rows and g_codes are the observation and the candidate code of each replicated row.
+    The observations matched directly with the id_var get the weight 1 for their base category.
+    """
+    from scipy.sparse import csr_matrix
+
+    if plan.ml is not None:
+        expanded = cat2cat_expanded(target_df, rows, DataFrame(c2c))
+        _expanded_ml(plan, expanded)
+        c2c = {name: expanded.c2c[name].to_numpy() for name in expanded.c2c.columns}
+    names = ["wei_naive_c2c", "wei_freq_c2c"] + plan.ml_names
+
+    labels: ndarray
+    if plan.dtype is not None:
+        assert plan.dict_codes is not None
+        labels = plan.dtype.categories.to_numpy()
+        cols = plan.dict_codes.take(g_codes)
+    else:
+        labels = plan.mapp.categories
+        cols = g_codes
+
+    weights = {name: c2c[name] for name in names}
+    if len(inner):
+        mid = _direct_c2c(plan, target_df, inner, direct_pos, index_c2c)
+        if plan.dtype is not None:
+            direct_cols = mid["g_new_c2c"].codes
+        else:
+            # base categories which are not candidates get new columns, NaN is not a category
+            direct_labels = mid["g_new_c2c"]
+            direct_cols = Index(labels).get_indexer(direct_labels)
+            missing = flatnonzero(direct_cols < 0)
+            extra_codes, extra = factorize(direct_labels.take(missing))
+            direct_cols[missing] = where(extra_codes >= 0, extra_codes + len(labels), -1)
+            if len(extra):
+                labels = concatenate([labels, extra])
+        rows = concatenate([rows, inner])
+        cols = concatenate([cols, direct_cols])
+        weights = {name: concatenate([weights[name], mid[name]]) for name in names}
+        # rows of the matrices ordered by observations
+        order = rows.argsort(kind="stable")
+        order = order[cols.take(order) >= 0]
+        rows, cols = rows.take(order), cols.take(order)
+        weights = {name: values.take(order) for name, values in weights.items()}
+
+    indptr = concatenate([[0], cumsum(bincount(rows, minlength=target_df.shape[0]))])
+    shape = (target_df.shape[0], len(labels))
+    matrices = {
+        name: csr_matrix((values.astype(float), cols, indptr), shape=shape)
+        for name, values in weights.items()
+    }
+    return cat2cat_sparse(target_df, matrices, labels)
+
+
+def _direct_c2c(
+    plan: _cat2cat_plan,
+    target_df: DataFrame,
+    inner: ndarray,
+    direct_pos: ndarray,
+    index_c2c: ndarray,
+) -> Dict[str, Any]:
+    """cat2cat columns of the observations matched directly with the id_var
+
+    The same as `dummy_c2c` gives, with the base period category as g_new_c2c.
+    direct_pos is the position of the matched base id for each inner observation.
+    """
+    assert plan.direct_values is not None
+    g_new: Any = plan.direct_values.take(direct_pos)
+    if plan.dtype is not None:
+        g_new = Categorical.from_codes(g_new, dtype=plan.dtype)
+    mid: Dict[str, Any] = dict(index_c2c=index_c2c.take(inner), g_new_c2c=g_new)
+    for name in ("rep_c2c", "wei_naive_c2c", "wei_freq_c2c"):
+        if name in target_df.columns:
+            mid[name] = target_df[name].to_numpy().take(inner)
+        else:
+            mid[name] = ones(len(inner), dtype=int64)
+    for ml_colname in plan.ml_names:
+        mid[ml_colname] = ones(len(inner), dtype=int64)
+    return mid
+
+
+def _append_values(values: Any, tail: Any) -> Any:
+    """Column values of the replicated rows followed by the ones of the directly matched rows"""
+    if isinstance(values, list):
+        return values + tail.tolist()
+    if isinstance(values, Categorical):
+        return Categorical.from_codes(
+            concatenate([values.codes, tail.codes]), dtype=values.dtype
+        )
+    return concatenate([values, tail])
+
+
+def _dummy_base(plan: _cat2cat_plan, df: DataFrame, offset: int = 0) -> DataFrame:
+    """Default cat2cat columns of another frame in the base coding, consistent with the plan base period"""
+    cols = list(df.columns)
+    df = dummy_c2c(df, plan.cat_var_base)
+    if "index_c2c" not in cols:
+        df["index_c2c"] = arange(offset, offset + len(df))
+    if plan.dtype is not None:
+        df["g_new_c2c"] = Categorical(df["g_new_c2c"], dtype=plan.dtype)
+    for ml_colname in plan.ml_names:
+        df[ml_colname] = 1
+    return df
+
+
+def _share_dictionary(plans: List[_cat2cat_plan], values: List[Any]) -> None:
+    """Recode the categorical plans to one dictionary, the union of their dictionaries and the values"""
+    labels = [
+        e for plan in plans if plan.dtype is not None for e in plan.dtype.categories.tolist()
+    ]
+    categories = Index(list(dict.fromkeys(labels + values)))
+    dtype = CategoricalDtype(categories)
+    for plan in plans:
+        assert plan.dtype is not None
+        recode = categories.get_indexer(plan.dtype.categories)
+        plan.dict_codes = recode.take(plan.dict_codes)
+        if plan.direct_values is not None:
+            found = plan.direct_values >= 0
+            plan.direct_values = where(found, recode.take(where(found, plan.direct_values, 0)), -1)
+        base_codes = plan.base_df["g_new_c2c"].cat.codes.to_numpy()
+        found = base_codes >= 0
+        plan.base_df["g_new_c2c"] = Categorical.from_codes(
+            where(found, recode.take(where(found, base_codes, 0)), -1), dtype=dtype
+        )
+        plan.dtype = dtype
+
+
+def _replicate(
+    mapp: MappingIndex, codes: ndarray, probs: ndarray
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """Replication kernel
+
+    For integer codes of target observations (-1 for not matched ones) returns
+    the number of replications of each observation and, for all replicated rows,
+    the candidate codes and their probabilities.
+    """
+    found = codes >= 0
+    lens = where(found, mapp.lengths.take(where(found, codes, 0)), 0)
+    starts = mapp.offsets.take(where(found, codes, 0))
+    ends = cumsum(lens)
+    # position of each replicated row in the flat candidates of the mapping
+    flat = arange(ends[-1] if len(ends) else 0) + repeat(starts - (ends - lens), lens)
+    return lens, mapp.indices.take(flat).astype(int64), probs.take(flat)
+
+
+def _categorical_dictionary(
+    categories: ndarray, codes: ndarray, values: ndarray
+) -> Tuple[CategoricalDtype, ndarray, ndarray]:
+    """One dictionary for the mapping candidates and the base period values
+
+    Values are given with their integer codes in categories, the ones with the -1 code
+    are added to the dictionary after the categories. NaN is not a category so it gets the -1 code.
+    Returns the dictionary and the codes of categories and of values in it.
+    """
+    found = codes >= 0
+    dict_codes, uniq = factorize(
+        concatenate([categories.astype(object), values[~found].astype(object)])
+    )
+    cat_codes = dict_codes[: len(categories)]
+    value_codes = empty(len(codes), dtype=dict_codes.dtype)
+    value_codes[found] = cat_codes.take(codes[found])
+    value_codes[~found] = dict_codes[len(categories) :]
+    return CategoricalDtype(Index(uniq.tolist())), cat_codes, value_codes
 
 
 def _resolve_frequencies(
     base_df: DataFrame,
     cat_var_base: str,
     multiplier_var: Optional[str],
-) -> Dict[Any, int]:
-    """Resolve the frequencies"""
-    freqs: Dict[Any, int]
+    categories: ndarray,
+    codes: Optional[ndarray] = None,
+) -> ndarray:
+    """Resolve the frequencies
+
+    The base period weights, the `wei_freq_c2c` column for a chained cat2cat result,
+    are multiplied by the multiplier and summed per category with a weighted bincount.
+    An array aligned with the categories is returned, categories missing in the base period get the `1e-12` floor.
+    The base period values could be already coded against categories, the codes argument.
+    """
+    cat_values = base_df[cat_var_base]
+    weights: Optional[ndarray] = None
     if "wei_freq_c2c" in base_df.columns:
-        grouped = base_df.groupby(cat_var_base)
-        if _PANDAS_HAS_INCLUDE_GROUPS:
-            freqs = grouped.apply(lambda x: sum(x["wei_freq_c2c"] * x.get(multiplier_var, 1)), include_groups=False).to_dict()
+        weights = base_df["wei_freq_c2c"].to_numpy(dtype=float)
+        if multiplier_var is not None and multiplier_var in base_df.columns:
+            weights = weights * base_df[multiplier_var].to_numpy(dtype=float)
+
+    if weights is None:
+        if multiplier_var is not None and multiplier_var in base_df.columns:
+            weights = base_df[multiplier_var].to_numpy(dtype=float)
         else:
-            freqs = grouped.apply(lambda x: sum(x["wei_freq_c2c"] * x.get(multiplier_var, 1))).to_dict()
-    else:
-        freqs = get_freqs(
-            base_df[cat_var_base].values, base_df.get(multiplier_var, None)
-        )
-    return freqs
+            weights = ones(len(cat_values))
+    if codes is None:
+        codes = Index(categories).get_indexer(cat_values)
+    found = codes >= 0
+    totals = bincount(codes[found], weights=weights[found], minlength=len(categories))
+    present = bincount(codes[found], minlength=len(categories)) > 0
+    if "wei_freq_c2c" not in base_df.columns:
+        # as in get_freqs, categories with a zero total are treated as not observed
+        present &= totals != 0
+    return where(present, totals, 1e-12)
@@ -1,9 +1,14 @@
-from typing import Any, Dict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
-from pandas import DataFrame, concat
+from pandas import DataFrame, Series, concat
+from sklearn.base import ClassifierMixin, clone
 from sklearn.model_selection import train_test_split
 
+from cat2cat.cache import ModelCache
 from cat2cat.dataclass import cat2cat_mappings, cat2cat_ml
 from cat2cat.cat2cat_ml_utils import (
     apply_ml_fallback,
@@ -13,7 +18,7 @@ from cat2cat.cat2cat_ml_utils import (
     resolve_ml_models,
     safe_nanmean,
 )
-from cat2cat.mappings import get_mappings
+from cat2cat.mappings import MappingIndex, _direction_index
 
 __all__ = ["cat2cat_ml_run"]
 
@@ -185,6 +190,13 @@ def cat2cat_ml_run(
         ValueError: if kwargs names/ranges are invalid or mapping coverage is
             below ``min_match``.
 
+    Notes:
+        Mapping groups are evaluated in parallel when ``ml.n_jobs`` is greater
+        than 1, in a pool set by ``ml.backend``. Each group uses fresh clones
+        of the models, so the results equal the serial run for a fixed
+        ``split_seed`` and models with a fixed ``random_state``. A failing
+        group or model gives NaN diagnostics, as in the serial run.
+
     Examples:
         >>> from sklearn.ensemble import RandomForestClassifier
         >>> from cat2cat import cat2cat_ml_run
@@ -219,17 +231,10 @@ def cat2cat_ml_run(
 
     train_data, _, features = prepare_ml_frames(ml)
     models = resolve_ml_models(ml)
-    mapps = get_mappings(mappings.trans)
-
-    if mappings.direction == "forward":
-        base_name = "old"
-    elif mappings.direction == "backward":
-        base_name = "new"
-
-    mapp = mapps["to_" + base_name]
+    mapp = _direction_index(mappings.trans, mappings.direction)
 
     cat_var = train_data[ml.cat_var].values
-    cat_var_vals = mappings.trans[base_name].unique()
+    cat_var_vals = mapp.categories
 
     if not (np.sum(np.isin(cat_var, cat_var_vals)) / len(cat_var)) > kwargs.get(
         "min_match", 0.8
@@ -242,109 +247,207 @@ def cat2cat_ml_run(
         n: g for n, g in train_data[features + [ml.cat_var]].groupby(ml.cat_var)
     }
 
-    res = dict()
-    for cat in mapp.keys():
-        try:
-            matched_cat = mapp.get(cat, [])
-            res[cat] = {
-                "naive": np.nan,
-                "freq": np.nan,
-                "naive_brier": np.nan,
-                "naive_mean_prob": np.nan,
-                "freq_brier": np.nan,
-                "freq_mean_prob": np.nan,
-            }
-            for model_name, _ in models:
-                res[cat][model_name] = np.nan
-                res[cat][f"{model_name}_brier"] = np.nan
-                res[cat][f"{model_name}_mean_prob"] = np.nan
-
-            data_small_g_list = [train_g.get(g) for g in matched_cat if g in train_g]
-            if len(data_small_g_list) == 0:
-                continue
+    items = list(mapp.items())
+    matched = [matched_cat for _, matched_cat in items]
+    groups = ([train_g[g] for g in matched_cat if g in train_g] for matched_cat in matched)
+    args = (
+        repeat(models), matched, groups, repeat(ml.cat_var), repeat(features), repeat(kwargs)
+    )
+    cats = [cat for cat, _ in items]
+    if ml.n_jobs == 1:
+        res = dict(zip(cats, map(_run_group, *args)))
+    else:
+        # the same split_seed for each group, so the results equal the serial run
+        pool = ThreadPoolExecutor if ml.backend == "thread" else ProcessPoolExecutor
+        with pool(max_workers=ml.n_jobs) as executor:
+            res = dict(zip(cats, executor.map(_run_group_clone, *args)))
 
-            data_small_g = concat(data_small_g_list, axis=0)
-            if (
-                (data_small_g.shape[0] < 10)
-                or (len(matched_cat) < 2)
-                or (np.sum(np.isin(matched_cat, data_small_g[ml.cat_var])) == 1)
-            ):
-                continue
+    return cat2cat_ml_run_results(res, mappings, ml, kwargs)
 
-            n_categories = len(matched_cat)
-            res[cat]["naive"] = 1 / n_categories
-            res[cat]["naive_mean_prob"] = 1 / n_categories
-            res[cat]["naive_brier"] = (1 - 1 / n_categories) / 2
 
-            X_train, X_test, y_train, y_test = train_test_split(
-                data_small_g[features],
-                data_small_g[ml.cat_var],
-                test_size=kwargs.get("test_prop", 0.2),
-                random_state=kwargs.get("split_seed", 42),
-            )
+def _run_group(
+    models: List[Tuple[str, ClassifierMixin]],
+    matched_cat: List[Any],
+    data_small_g_list: List[DataFrame],
+    cat_var: str,
+    features: List[str],
+    kwargs: Dict[str, Any],
+) -> Dict[str, float]:
+    """Diagnostics of one mapping group, NaN for the ones which could not be assessed"""
+    res: Dict[str, float] = {
+        "naive": np.nan,
+        "freq": np.nan,
+        "naive_brier": np.nan,
+        "naive_mean_prob": np.nan,
+        "freq_brier": np.nan,
+        "freq_mean_prob": np.nan,
+    }
+    for model_name, _ in models:
+        res[model_name] = np.nan
+        res[f"{model_name}_brier"] = np.nan
+        res[f"{model_name}_mean_prob"] = np.nan
+
+    try:
+        if len(data_small_g_list) == 0:
+            return res
+
+        data_small_g = concat(data_small_g_list, axis=0)
+        if (
+            (data_small_g.shape[0] < 10)
+            or (len(matched_cat) < 2)
+            or (np.sum(np.isin(matched_cat, data_small_g[cat_var])) == 1)
+        ):
+            return res
+
+        n_categories = len(matched_cat)
+        res["naive"] = 1 / n_categories
+        res["naive_mean_prob"] = 1 / n_categories
+        res["naive_brier"] = (1 - 1 / n_categories) / 2
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            data_small_g[features],
+            data_small_g[cat_var],
+            test_size=kwargs.get("test_prop", 0.2),
+            random_state=kwargs.get("split_seed", 42),
+        )
+
+        gcounts = y_train.value_counts()
+        gfreq_max = gcounts.index[0]
+        res["freq"] = float(np.nanmean(gfreq_max == y_test))
 
-            gcounts = y_train.value_counts()
-            gfreq_max = gcounts.index[0]
-            res[cat]["freq"] = float(np.nanmean(gfreq_max == y_test))
+        train_freqs = y_train.value_counts(normalize=True)
+        freq_probs = DataFrame(0.0, index=range(len(y_test)), columns=matched_cat)
+        for freq_cat, freq_value in train_freqs.items():
+            if freq_cat in freq_probs.columns:
+                freq_probs[freq_cat] = float(freq_value)
+        res["freq_brier"] = brier_score(freq_probs, y_test.values, matched_cat)
+        res["freq_mean_prob"] = mean_true_probability(freq_probs, y_test.values)
 
-            train_freqs = y_train.value_counts(normalize=True)
-            freq_probs = DataFrame(0.0, index=range(len(y_test)), columns=matched_cat)
-            for freq_cat, freq_value in train_freqs.items():
-                if freq_cat in freq_probs.columns:
-                    freq_probs[freq_cat] = float(freq_value)
-            res[cat]["freq_brier"] = brier_score(freq_probs, y_test.values, matched_cat)
-            res[cat]["freq_mean_prob"] = mean_true_probability(freq_probs, y_test.values)
+        if (X_test.shape[0] == 0) or (X_train.shape[0] < 5):
+            return res
 
-            if (X_test.shape[0] == 0) or (X_train.shape[0] < 5):
+        for model_name, model in models:
+            try:
+                model.fit(X_train, y_train)  # type: ignore
+                preds = model.predict(X_test)  # type: ignore
+                probs = DataFrame(model.predict_proba(X_test))  # type: ignore
+                probs.columns = model.classes_  # type: ignore
+                res[model_name] = float(np.nanmean(preds == y_test))
+                res[f"{model_name}_brier"] = brier_score(probs, y_test.values, matched_cat)
+                res[f"{model_name}_mean_prob"] = mean_true_probability(probs, y_test.values)
+            except Exception:
                 continue
+    except Exception:
+        pass
+    return res
 
-            for model_name, model in models:
-                try:
-                    model.fit(X_train, y_train)  # type: ignore
-                    preds = model.predict(X_test)  # type: ignore
-                    probs = DataFrame(model.predict_proba(X_test))  # type: ignore
-                    probs.columns = model.classes_  # type: ignore
-                    res[cat][model_name] = float(np.nanmean(preds == y_test))
-                    res[cat][f"{model_name}_brier"] = brier_score(
-                        probs, y_test.values, matched_cat
-                    )
-                    res[cat][f"{model_name}_mean_prob"] = mean_true_probability(
-                        probs, y_test.values
-                    )
-                except Exception:
-                    continue
-        except Exception:
-            continue
 
-    return cat2cat_ml_run_results(res, mappings, ml, kwargs)
+def _run_group_clone(
+    models: List[Tuple[str, ClassifierMixin]], *args: Any
+) -> Dict[str, float]:
+    """The same as `_run_group` with fresh clones of the models, which are not shared between workers"""
+    return _run_group([(name, clone(model)) for name, model in models], *args)
 
 
 def _cat2cat_ml(
-    ml: cat2cat_ml, mapp: Dict[Any, Any], target_df: DataFrame, cat_var_target: str
+    ml: cat2cat_ml,
+    mapp: MappingIndex,
+    target_df: DataFrame,
+    cat_var_target: str,
 ) -> None:
     """cat2cat ml optional part."""
     train_data, _, features = prepare_ml_frames(ml, target_df)
     models = resolve_ml_models(ml)
     ml_names = ["wei_" + model_name + "_c2c" for model_name, _ in models]
-    target_df[ml_names] = np.nan
-
-    for target_cat in list(mapp.keys()):
-        base_cats = mapp[target_cat]
-        ml_cat_var = train_data[ml.cat_var]
+    ml_values = {name: np.full(target_df.shape[0], np.nan) for name in ml_names}
+
+    target_codes = _notna_codes(mapp.get_indexer, target_df[cat_var_target])
+    # a key with a single candidate is certain, no model is needed
+    found = target_codes >= 0
+    certain = np.flatnonzero(found & (mapp.lengths.take(np.where(found, target_codes, 0)) == 1))
+    for values in ml_values.values():
+        values[certain] = 1.0
+
+    groups = _ml_groups(ml, mapp, train_data, features, target_df, target_codes)
+    if ml.n_jobs == 1:
+        for group in groups:
+            _fill_ml_values(ml_values, group.target_pos, _fit_group(models, group, ml.cache))
+    else:
+        # groups write to disjoint rows, the results are collected in the groups order
+        pool = ThreadPoolExecutor if ml.backend == "thread" else ProcessPoolExecutor
+        with pool(max_workers=ml.n_jobs) as executor:
+            groups_list = list(groups)
+            fitted = executor.map(
+                _fit_group_clone, repeat(models), groups_list, repeat(ml.cache)
+            )
+            for group, weights in zip(groups_list, fitted):
+                _fill_ml_values(ml_values, group.target_pos, weights)
+
+    for ml_colname, values in ml_values.items():
+        target_df[ml_colname] = values
+    apply_ml_fallback(target_df, ml_names, ml.on_fail.lower(), ml.fail_warn)
+
+
+@dataclass
+class _ml_group:
+    """Training and target data of one mapping group"""
+
+    target_pos: np.ndarray
+    target_rows: DataFrame
+    X_train: DataFrame
+    y_train: Series
+    X_test: DataFrame
+    test_index_c2c: np.ndarray
+
+
+def _ml_groups(
+    ml: cat2cat_ml,
+    mapp: MappingIndex,
+    train_data: DataFrame,
+    features: List[str],
+    target_df: DataFrame,
+    target_codes: np.ndarray,
+) -> Iterator[_ml_group]:
+    """Mapping groups with enough complete training observations and any target observation
+
+    Keys with the same set of candidates share the training data, so they form one group,
+    which fits the models once and predicts for the target rows of all its keys.
+    Keys with a single candidate are skipped.
+    """
+    # rows of each mapping key and of each candidate category, found once for all groups
+    target_order, target_offsets = _group_index(target_codes, len(mapp))
+    train_order, train_offsets = _group_index(
+        _notna_codes(mapp.get_category_indexer, train_data[ml.cat_var]),
+        len(mapp.categories),
+    )
+
+    # keys with any target observation by their candidates signature
+    signatures: Dict[bytes, List[int]] = dict()
+    lengths = mapp.lengths
+    for key in np.flatnonzero((np.diff(target_offsets) > 0) & (lengths > 1)).tolist():
+        candidates = mapp.indices[mapp.offsets[key] : mapp.offsets[key + 1]]
+        signatures.setdefault(np.sort(candidates).tobytes(), []).append(key)
+
+    for keys in signatures.values():
+        target_pos = np.sort(
+            np.concatenate(
+                [target_order[target_offsets[k] : target_offsets[k + 1]] for k in keys]
+            )
+        )
+        base_codes = mapp.indices[mapp.offsets[keys[0]] : mapp.offsets[keys[0] + 1]]
+        # training rows of all candidates, in their original order
+        train_pos = np.sort(
+            np.concatenate(
+                [train_order[train_offsets[c] : train_offsets[c + 1]] for c in base_codes]
+            )
+        )
 
-        if not any(np.isin(base_cats, ml_cat_var.unique())):
+        if train_pos.shape[0] < 5:
             continue
 
-        target_cat_index = np.isin(target_df[cat_var_target].values, target_cat)
-        ml_cat_index = np.isin(train_data[ml.cat_var].values, base_cats)
-
-        data_ml_train = train_data.loc[ml_cat_index, :]
-        data_ml_target = target_df.loc[target_cat_index, :]
-
-        if (data_ml_target.shape[0] == 0) or (data_ml_train.shape[0] < 5):
-            continue
+        data_ml_train = train_data.iloc[train_pos, :]
+        data_ml_target = target_df.iloc[target_pos, :]
 
-        target_cats = data_ml_target["g_new_c2c"]
         data_ml_target_uniq = data_ml_target.drop_duplicates(
             subset=["index_c2c"] + features
         )
@@ -355,29 +458,81 @@ def _cat2cat_ml(
         if train_complete.sum() < 5 or target_complete.sum() == 0:
             continue
 
-        X_train = data_ml_train.loc[train_complete, features]
-        y_train = data_ml_train.loc[train_complete, ml.cat_var]
-        X_test = data_ml_target_uniq.loc[target_complete, features]
-        test_index_c2c = index_c2c[target_complete.values]
+        yield _ml_group(
+            target_pos=target_pos,
+            target_rows=data_ml_target[["index_c2c", "g_new_c2c"]],
+            X_train=data_ml_train.loc[train_complete, features],
+            y_train=data_ml_train.loc[train_complete, ml.cat_var],
+            X_test=data_ml_target_uniq.loc[target_complete, features],
+            test_index_c2c=index_c2c[target_complete.values],
+        )
 
-        for model_name, model in models:
-            ml_colname = "wei_" + model_name + "_c2c"
 
-            try:
-                model.fit(X=X_train, y=y_train)  # type: ignore
-                preds = model.predict_proba(X=X_test)  # type: ignore
-
-                preds_df = DataFrame(preds)
-                preds_df.columns = model.classes_  # type: ignore
-                preds_df[np.setdiff1d(target_cats.unique(), model.classes_)] = 0  # type: ignore
-                preds_df["index_c2c"] = test_index_c2c
-                preds_df_melt = preds_df.melt(id_vars="index_c2c", var_name="g_new_c2c")
-                merge_on = ["index_c2c", "g_new_c2c"]
-                p_order = target_df.loc[target_cat_index, merge_on].merge(
-                    preds_df_melt, on=merge_on, how="left", sort=False
-                )
-                target_df.loc[target_cat_index, ml_colname] = p_order["value"].values
-            except Exception:
-                continue
+def _fit_group(
+    models: List[Tuple[str, ClassifierMixin]],
+    group: _ml_group,
+    cache: Optional[ModelCache] = None,
+) -> Dict[str, np.ndarray]:
+    """ml weights of the target rows of one mapping group, failed models are skipped"""
+    res = dict()
+    for model_name, model in models:
+        try:
+            if cache is not None:
+                key = cache.key(group.X_train, group.y_train, model)
+                fitted = cache.get(key)
+                if fitted is not None:
+                    model = fitted
+                else:
+                    model.fit(X=group.X_train, y=group.y_train)  # type: ignore
+                    cache.put(key, model)
+            else:
+                model.fit(X=group.X_train, y=group.y_train)  # type: ignore
+            preds = model.predict_proba(X=group.X_test)  # type: ignore
+
+            preds_df = DataFrame(preds)
+            preds_df.columns = model.classes_  # type: ignore
+            preds_df[np.setdiff1d(group.target_rows["g_new_c2c"].unique(), model.classes_)] = 0  # type: ignore
+            preds_df["index_c2c"] = group.test_index_c2c
+            preds_df_melt = preds_df.melt(id_vars="index_c2c", var_name="g_new_c2c")
+            merge_on = ["index_c2c", "g_new_c2c"]
+            p_order = group.target_rows.merge(
+                preds_df_melt, on=merge_on, how="left", sort=False
+            )
+            res["wei_" + model_name + "_c2c"] = p_order["value"].values
+        except Exception:
+            continue
+    return res
+
+
+def _fit_group_clone(
+    models: List[Tuple[str, ClassifierMixin]],
+    group: _ml_group,
+    cache: Optional[ModelCache] = None,
+) -> Dict[str, np.ndarray]:
+    """The same as `_fit_group` with fresh clones of the models, which are not shared between workers"""
+    return _fit_group([(name, clone(model)) for name, model in models], group, cache)
+
+
+def _fill_ml_values(
+    ml_values: Dict[str, np.ndarray], target_pos: np.ndarray, weights: Dict[str, np.ndarray]
+) -> None:
+    for ml_colname, values in weights.items():
+        ml_values[ml_colname][target_pos] = values
+
+
+def _notna_codes(indexer: Callable[[Any], np.ndarray], values: Series) -> np.ndarray:
+    """Integer codes of values, -1 for missing values, which are never matched"""
+    codes = indexer(values)
+    codes[values.isna().to_numpy()] = -1
+    return codes
 
-    apply_ml_fallback(target_df, ml_names, ml.on_fail.lower(), ml.fail_warn)
\ No newline at end of file
+
+def _group_index(codes: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Group index of integer codes, rows with the -1 code are dropped
+
+    Returns the row positions ordered by group, stable within a group, and the offsets of the n groups,
+    so the rows of the i-th group are `order[offsets[i]:offsets[i + 1]]`.
+    """
+    counts = np.bincount(codes[codes >= 0], minlength=n)
+    order = np.argsort(codes, kind="stable")[len(codes) - counts.sum() :]
+    return order, np.concatenate([[0], np.cumsum(counts)])
@@ -1,10 +1,13 @@
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Sequence
+from typing import Any, Dict, Optional, Sequence, Union
 
 from pandas import DataFrame
 from sklearn.base import ClassifierMixin
 
-__all__ = ["cat2cat_data", "cat2cat_mappings", "cat2cat_ml"]
+from cat2cat.cache import ModelCache
+from cat2cat.mappings import MappingIndex
+
+__all__ = ["cat2cat_data", "cat2cat_mappings", "cat2cat_ml", "cat2cat_spill"]
 
 
 @dataclass(frozen=True)
@@ -18,6 +21,7 @@ class cat2cat_data:
         cat_var_new (str): name of the categorical variable in the newer time point.
         time_var (str): name of the time variable.
         id_var (Optional[str]): name of the unique identifier variable - if this is specified then for subjects observe in both periods the direct mapping is applied.
+            For an id duplicated in the base period its last observation is used, missing ids are never matched.
         multiplier_var (Optional[str]): name of the multiplier variable - number of replication needed to reproduce the population.
     """
 
@@ -75,9 +79,11 @@ class cat2cat_mappings:
     """The dataclass to represent the mappings argument used in the cat2cat procedure
 
     Args:
-        trans (DataFrame): mapping (transition) table (with 2 columns, old and new encoding) - all categories for cat_var in old and new datasets have to be included.
+        trans (DataFrame or MappingIndex): mapping (transition) table (with 2 columns, old and new encoding) - all categories for cat_var in old and new datasets have to be included.
+                            It could be a precomputed `MappingIndex` too, e.g. from `cat2cat.mappings.compose_mappings`,
+                            then its `weights` are used as probabilities when freqs are not provided.
         diretion (str): "backward" or "forward"
-        freqs (Optional[Dict[Any, int]]): If It is not provided then is assessed automatically.
+        freqs (Optional[Dict[Any, Union[int, float]]]): If It is not provided then is assessed automatically.
                             Artificial counts for each variable level in the base period.
                             It is optional nevertheless will be often needed, as gives more control.
 
@@ -86,19 +92,24 @@ class cat2cat_mappings:
         The observation from targeted for an updated period without a matched category from base period is removed.
     """
 
-    trans: DataFrame
+    trans: Union[DataFrame, MappingIndex]
     direction: str
-    freqs: Optional[Dict[Any, int]] = None
+    freqs: Optional[Dict[Any, Union[int, float]]] = None
 
     def __post_init__(self) -> None:
-        if not isinstance(self.trans, DataFrame):
-            raise TypeError("trans has to be a pandas.DataFrame")
-        if self.trans.shape[1] != 2:
+        if not isinstance(self.trans, (DataFrame, MappingIndex)):
+            raise TypeError("trans has to be a pandas.DataFrame or MappingIndex")
+        if isinstance(self.trans, DataFrame) and self.trans.shape[1] != 2:
             raise ValueError("trans has to have two columns")
         if not isinstance(self.direction, str):
             raise TypeError("direction has to be a str")
         if self.direction not in ["forward", "backward"]:
             raise ValueError("direction has to be one of 'forward' or 'backward'")
+        if isinstance(self.trans, MappingIndex) and self.trans.direction not in [
+            None,
+            self.direction,
+        ]:
+            raise ValueError("trans MappingIndex was built for the other direction")
         if self.freqs is not None and not isinstance(self.freqs, dict):
             raise TypeError("freqs has to be a dict, or None")
 
@@ -115,6 +126,14 @@ class cat2cat_ml:
         models (Sequence[ClassifierMixin]): scikit-learn classifier instances.
         on_fail (str): how failed ML weights are handled: "freq", "naive", "na", or "error".
         fail_warn (bool): warn when failed ML weights are replaced or retained as missing.
+        n_jobs (int): number of workers fitting the mapping groups at once, each group fits fresh clones of the models.
+            Results do not depend on n_jobs for models with a fixed `random_state`. Defaults to 1.
+        backend (str): "thread" or "process" pool used when n_jobs is greater than 1.
+            Threads share the data and suit models which release the GIL, processes suit pure Python models.
+            Defaults to "thread".
+        cache (Optional[ModelCache]): on-disk cache of the models fitted for each mapping group,
+            please check out `cat2cat.cache.ModelCache`. Later runs with the same training rows, features
+            and model parameters load the fitted models instead of fitting them. Defaults to None.
     """
 
     data: DataFrame
@@ -123,6 +142,9 @@ class cat2cat_ml:
     models: Sequence[ClassifierMixin]
     on_fail: str = "freq"
     fail_warn: bool = True
+    n_jobs: int = 1
+    backend: str = "thread"
+    cache: Optional[ModelCache] = None
 
     def __post_init__(self) -> None:
         if not isinstance(self.data, DataFrame):
@@ -154,3 +176,40 @@ class cat2cat_ml:
             raise ValueError("on_fail has to be one of: 'freq', 'naive', 'na', or 'error'")
         if not isinstance(self.fail_warn, bool):
             raise TypeError("fail_warn has to be a bool")
+        if not isinstance(self.n_jobs, int) or self.n_jobs < 1:
+            raise ValueError("n_jobs has to be a positive int")
+        if self.backend not in ("thread", "process"):
+            raise ValueError("backend has to be one of: 'thread' or 'process'")
+        if self.cache is not None and not isinstance(self.cache, ModelCache):
+            raise TypeError("cache has to be a ModelCache instance or None")
+
+
+@dataclass(frozen=True)
+class cat2cat_spill:
+    """The dataclass to represent the spill argument used in the cat2cat procedure
+
+    The replicated target period columns are written to memory-mapped `.npy` files,
+    so the operating system pages them to the disk instead of keeping them in the memory.
+    Numeric, boolean, datetime and categorical (codes) columns are memory-mapped,
+    other columns like object or string ones are kept in the memory.
+
+    Args:
+        path (str): scratch directory for the files, created if it does not exist. Existing files are overwritten.
+        keep (bool): if True the files are kept with a `meta.json`, so the frame could be loaded again
+            with `cat2cat.spill.load_spill`. If False the files are removed right after they are mapped,
+            and the disk space is freed when the frame is released, which requires a POSIX system like Linux.
+            By default False.
+        chunksize (int): number of rows replicated at once when the files are written. Defaults to 1_000_000.
+    """
+
+    path: str
+    keep: bool = False
+    chunksize: int = 1_000_000
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.path, str):
+            raise TypeError("path has to be a str")
+        if not isinstance(self.keep, bool):
+            raise TypeError("keep has to be a bool")
+        if not isinstance(self.chunksize, int) or self.chunksize < 1:
+            raise ValueError("chunksize has to be a positive int")
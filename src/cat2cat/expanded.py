@@ -0,0 +1,118 @@
+from typing import List, Optional, Sequence, Tuple, Union
+
+from numpy import ndarray
+from pandas import DataFrame, Series, concat
+
+from cat2cat.spill import _spill_expanded
+
+__all__ = ["cat2cat_expanded"]
+
+
+class cat2cat_expanded:
+    """Lazy replicated target period returned by `cat2cat(..., output="lazy")`
+
+    Instead of copying every column for each candidate category the object keeps
+    the target period frame, the replication index and the cat2cat columns.
+    Only the columns which are accessed are replicated, so downstream models
+    which need a few columns do not pay for the whole replicated frame.
+    `to_frame()` returns the same DataFrame as `cat2cat(..., output="frame")`.
+
+    Args:
+        data (DataFrame): target period observations, not replicated.
+        rows (numpy.ndarray): position in data of each replicated row.
+        c2c (DataFrame): cat2cat columns of the replicated rows, like index_c2c, g_new_c2c, rep_c2c and wei_(method)_c2c.
+        tail (Optional[DataFrame]): rows appended after the replicated ones,
+            the observations matched directly with `cat2cat_data.id_var`. Defaults to None.
+
+    >>> from cat2cat import cat2cat
+    >>> from cat2cat.dataclass import cat2cat_data, cat2cat_mappings
+    >>> from cat2cat.datasets import load_trans, load_occup
+    >>> occup = load_occup()
+    >>> data = cat2cat_data(occup.loc[occup.year == 2008, :], occup.loc[occup.year == 2010, :],
+    ...                     "code", "code", "year")
+    >>> res = cat2cat(data, cat2cat_mappings(load_trans(), "backward"), output="lazy")
+    >>> res["old"][["g_new_c2c", "wei_freq_c2c", "salary"]].shape == (len(res["old"]), 3)
+    True
+    >>> res["old"].to_frame().shape == res["old"].shape
+    True
+    """
+
+    def __init__(
+        self,
+        data: DataFrame,
+        rows: ndarray,
+        c2c: DataFrame,
+        tail: Optional[DataFrame] = None,
+    ) -> None:
+        if len(c2c) != len(rows):
+            raise ValueError("c2c has to have one row for each replicated row")
+        self.data = data
+        self.rows = rows
+        self.c2c = c2c.reset_index(drop=True)
+        self.tail = tail
+
+    @property
+    def columns(self) -> List[str]:
+        """Columns of the materialized frame, in the same order as `to_frame()`."""
+        cols = list(self.data.columns)
+        cols += [c for c in self.c2c.columns if c not in cols]
+        if self.tail is not None:
+            cols += [c for c in self.tail.columns if c not in cols]
+        return cols
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), len(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.rows) + (len(self.tail) if self.tail is not None else 0)
+
+    def __getitem__(self, key: Union[str, Sequence[str]]) -> Union[Series, DataFrame]:
+        if isinstance(key, str):
+            return self.to_frame([key])[key]
+        return self.to_frame(list(key))
+
+    def to_frame(self, columns: Optional[Sequence[str]] = None) -> DataFrame:
+        """Materialize the replicated frame, all columns or only the selected ones.
+
+        Args:
+            columns (Optional[Sequence[str]]): columns to materialize. Defaults to None, all columns.
+
+        Returns:
+            DataFrame: replicated rows followed by the tail rows.
+        """
+        cols = self.columns if columns is None else list(columns)
+        missing = [c for c in cols if c not in self.columns]
+        if missing:
+            raise KeyError("columns not found: {}".format(missing))
+        res = self._replicated(cols)
+        if self.tail is not None:
+            res = concat([res, self.tail.loc[:, [c for c in cols if c in self.tail]]])
+        return res
+
+    def spill(self, path: str, keep: bool = False, chunksize: int = 1_000_000) -> DataFrame:
+        """Materialize the replicated frame to memory-mapped files in a scratch directory
+
+        Args:
+            path (str): scratch directory, please check out `cat2cat.dataclass.cat2cat_spill` for more information.
+            keep (bool): if True the files are kept and could be loaded with `cat2cat.spill.load_spill`. Defaults to False.
+            chunksize (int): number of rows replicated at once. Defaults to 1_000_000.
+
+        Returns:
+            DataFrame: the same as `to_frame()`, with columns backed by the files.
+        """
+        return _spill_expanded(self, path, keep, chunksize)
+
+    def _replicated(self, columns: Sequence[str]) -> DataFrame:
+        # the data columns are replicated with one take, cat2cat columns are already replicated
+        data_cols = [c for c in columns if c not in self.c2c.columns]
+        res = self.data.loc[:, data_cols].iloc[self.rows, :].reset_index(drop=True)
+        for c in columns:
+            if c in self.c2c.columns:
+                res[c] = self.c2c[c].array
+        return res.loc[:, list(columns)]
+
+    def __repr__(self) -> str:
+        return "cat2cat_expanded(rows={}, columns={}, replicated_from={})".format(
+            len(self), len(self.columns), len(self.data)
+        )
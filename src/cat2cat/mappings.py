@@ -1,11 +1,47 @@
-from pandas import DataFrame, Series
-from numpy import ndarray, unique, repeat, array, round, unique, sort, isnan
-
-from collections.abc import Iterable
-from collections import OrderedDict
-from typing import Union, Optional, Any, List, Dict, Sequence, TypeVar
-
-__all__ = ["get_mappings", "cat_apply_freq", "get_freqs"]
+from pandas import DataFrame, Index, Series, factorize
+from pandas.api.types import infer_dtype
+from numpy import (
+    ndarray,
+    unique,
+    repeat,
+    array,
+    asarray,
+    round,
+    argsort,
+    arange,
+    bincount,
+    concatenate,
+    cumsum,
+    diff,
+    empty,
+    float64,
+    int32,
+    int64,
+    ones,
+    where,
+    load,
+    save,
+)
+
+from cat2cat.cache import mappings_cache, fingerprint_freqs, fingerprint_table
+
+from collections.abc import Iterable, Mapping
+import json
+import os
+from typing import Union, Optional, Any, Iterator, List, Dict, Sequence, Tuple, TypeVar
+
+__all__ = [
+    "get_mappings",
+    "get_mapping_index",
+    "save_mapping_index",
+    "load_mapping_index",
+    "MappingIndex",
+    "cat_apply_freq",
+    "candidate_probs",
+    "compose_mappings",
+    "get_mapping_matrix",
+    "get_freqs",
+]
 
 Table = TypeVar("Table", DataFrame, ndarray)
 
@@ -38,7 +74,32 @@ def get_mappings(x: Table) -> Dict[str, Dict[Any, List[Any]]]:
     >>> mappings["to_old"]
     {111101.0: [1111.0], 111102.0: [1111.0], 111405.0: [1123.0, nan], 112006.0: [1212.0], 112008.0: [1212.0], 112090.0: [1212.0], nan: [1212.0]}
     >>> mappings["to_new"]
-    {1111.0: [111101.0, 111102.0], 1123.0: [111405.0], 1212.0: [112006.0, 112008.0, 112090.0, nan], nan: [111405.0]}
+    {1111.0: [111101.0, 111102.0], 1123.0: [111405.0], nan: [111405.0], 1212.0: [112006.0, 112008.0, 112090.0, nan]}
+    """
+    return {name: index.to_dict() for name, index in get_mapping_index(x).items()}
+
+
+def get_mapping_index(x: Table) -> Dict[str, "MappingIndex"]:
+    """Transforming a mapping table to two compact `MappingIndex` objects
+
+    The same as `get_mappings` but the associative lists are kept in a CSR like layout,
+    integer codes of candidates and offsets of each key, instead of Python lists.
+    The returned objects still offer a read-only dict like access.
+    Results are cached by the content of the transition table, see `cat2cat.cache.mappings_cache`.
+
+    Args:
+        x (pandas.DataFrame or numpy.ndarray): transition table with 2 columns where first column is assumed to be the older encoding.
+
+    Returns:
+        Dict[str, MappingIndex]: dict with 2 `MappingIndex` objects, `to_old` and `to_new`.
+
+    >>> from cat2cat.mappings import get_mapping_index
+    >>> from cat2cat.datasets import load_trans
+    >>> mappings = get_mapping_index(load_trans())
+    >>> mappings["to_new"]["3481"]
+    ['441401', '441402', '441403', '441490']
+    >>> mappings["to_new"].lengths[:3]
+    array([3, 3, 1])
     """
     if not hasattr(x, "shape"):
         raise TypeError("get_mappings input has to be ndarray or DataFrame")
@@ -48,46 +109,291 @@ def get_mappings(x: Table) -> Dict[str, Dict[Any, List[Any]]]:
         )
 
     if isinstance(x, DataFrame):
-        return get_mappings_df(x)
+        columns = _df_columns
     elif isinstance(x, ndarray):
-        return get_mappings_array(x)
+        columns = _array_columns
     else:
         raise TypeError("get_mappings input has to be ndarray or DataFrame")
 
-def get_mappings_array(x: ndarray) -> Dict[str, Dict[Any, List[Any]]]:
-    ff = x[:, 0].copy()
-    ss = x[:, 1].copy()
+    key = ("mappings", fingerprint_table(x))
+    mapps = mappings_cache.get(key)
+    if mapps is None:
+        mapps = _compile_mappings(*columns(x))
+        for name, index in mapps.items():
+            index.fingerprint = key[1] + ":" + name
+        mappings_cache.put(key, mapps)
+    return dict(mapps)
 
-    if ff.dtype != ss.dtype:
-        raise ValueError("mapping table columns must share the same dtype")
-    col_type = ff.dtype
 
-    from_old = list(OrderedDict.fromkeys(ff))
-    from_new = list(OrderedDict.fromkeys(ss))
+_ARTIFACT_FORMAT = "cat2cat.MappingIndex"
+_ARTIFACT_VERSION = 1
+_ARTIFACT_ARRAYS = ("key_labels", "categories", "indices", "offsets", "weights")
+
 
-    to_old = dict()
-    for e in from_new:
-        if (col_type in [float, int]) and isnan(e):
-            idx = isnan(ss)
-        else:
-            idx = ss == e
+def save_mapping_index(
+    to_x: "MappingIndex",
+    path: str,
+    freqs: Optional[Dict[Any, Union[int, float]]] = None,
+) -> None:
+    """Saving a compiled mapping to a directory of `.npy` files
 
-        # sorted so results are stable
-        to_old[e] = sorted(unique(ff[idx]))
+    The arrays of a `MappingIndex` (keys, candidate categories, candidate codes, offsets and optional weights)
+    are saved as separate `.npy` files with a versioned `meta.json`, so they can be memory-mapped by `load_mapping_index`.
+    String labels are stored as fixed width unicode arrays.
 
-    to_new = dict()
-    for e in from_old:
-        if (col_type in [float, int]) and isnan(e):
-            idx = isnan(ff)
-        else:
-            idx = ff == e
+    Args:
+        to_x (MappingIndex): object returned by `get_mapping_index` or `compose_mappings` function.
+        path (str): directory to save to, created if it does not exist.
+        freqs (Optional[Dict[Any, Union[int, float]]]): object like the one returned by the `get_freqs` function,
+            if provided candidate probabilities are saved as the `weights`. Defaults to None.
+
+    >>> import tempfile, os
+    >>> from cat2cat.mappings import get_mapping_index, save_mapping_index, load_mapping_index
+    >>> from cat2cat.datasets import load_trans
+    >>> mapp = get_mapping_index(load_trans())["to_new"]
+    >>> path = os.path.join(tempfile.mkdtemp(), "trans_to_new")
+    >>> save_mapping_index(mapp, path)
+    >>> loaded = load_mapping_index(path)
+    >>> loaded["3481"]
+    ['441401', '441402', '441403', '441490']
+    >>> loaded.direction
+    'backward'
+    """
+    if not isinstance(to_x, MappingIndex):
+        raise TypeError("to_x has to be a MappingIndex")
+    if not isinstance(path, (str, os.PathLike)):
+        raise TypeError("path has to be a str or os.PathLike")
+    if freqs is not None and not isinstance(freqs, dict):
+        raise TypeError("freqs has to be a dict, or None")
+
+    weights = candidate_probs(to_x, freqs) if freqs is not None else to_x.weights
+    arrays = dict(
+        key_labels=_storable_labels(to_x.key_labels),
+        categories=_storable_labels(to_x.categories),
+        indices=to_x.indices,
+        offsets=to_x.offsets,
+        weights=weights,
+    )
+    os.makedirs(path, exist_ok=True)
+    for name, arr in arrays.items():
+        if arr is not None:
+            save(os.path.join(path, name + ".npy"), arr, allow_pickle=False)
+    meta = dict(
+        format=_ARTIFACT_FORMAT,
+        version=_ARTIFACT_VERSION,
+        direction=to_x.direction,
+        fingerprint=to_x.fingerprint,
+        arrays=[name for name, arr in arrays.items() if arr is not None],
+    )
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def load_mapping_index(path: str, mmap: bool = True) -> "MappingIndex":
+    """Loading a compiled mapping saved by `save_mapping_index`
 
-        # sorted so results are stable
-        to_new[e] = sorted(unique(ss[idx]))
+    Args:
+        path (str): directory with the saved mapping.
+        mmap (bool): if True arrays are memory-mapped read-only, so processes loading the same files share their pages.
+            Defaults to True.
+
+    Returns:
+        MappingIndex: the saved mapping, with its `direction`, `weights` and `fingerprint`.
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        raise TypeError("path has to be a str or os.PathLike")
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format") != _ARTIFACT_FORMAT:
+        raise ValueError("path does not contain a saved MappingIndex")
+    if meta.get("version") != _ARTIFACT_VERSION:
+        raise ValueError(
+            "unsupported MappingIndex format version {}".format(meta.get("version"))
+        )
+
+    arrays = {
+        name: load(
+            os.path.join(path, name + ".npy"),
+            mmap_mode="r" if mmap else None,
+            allow_pickle=False,
+        )
+        for name in meta["arrays"]
+        if name in _ARTIFACT_ARRAYS
+    }
+    index = MappingIndex(
+        key_labels=arrays["key_labels"],
+        categories=arrays["categories"],
+        indices=arrays["indices"],
+        offsets=arrays["offsets"],
+        weights=arrays.get("weights"),
+        direction=meta["direction"],
+    )
+    index.fingerprint = meta["fingerprint"]
+    return index
+
+
+def _storable_labels(x: ndarray) -> ndarray:
+    """Labels without Python objects, so they can be saved without pickle and memory-mapped"""
+    if x.dtype != object:
+        return x
+    if infer_dtype(x, skipna=False) not in ("string", "empty"):
+        raise ValueError(
+            "only numeric or string categories can be saved, use a single type in the mapping table"
+        )
+    return x.astype(str)
+
+
+def _direction_index(trans: Union[Table, "MappingIndex"], direction: str) -> "MappingIndex":
+    """The `MappingIndex` from target to base categories for a `cat2cat_mappings.direction`"""
+    if isinstance(trans, MappingIndex):
+        return trans
+    return get_mapping_index(trans)["to_old" if direction == "forward" else "to_new"]
+
+
+def get_mappings_array(x: ndarray) -> Dict[str, Dict[Any, List[Any]]]:
+    mapps = _compile_mappings(*_array_columns(x))
+    return {name: index.to_dict() for name, index in mapps.items()}
 
-    return dict(to_old=to_old, to_new=to_new)
 
 def get_mappings_df(x: DataFrame) -> Dict[str, Dict[Any, List[Any]]]:
+    mapps = _compile_mappings(*_df_columns(x))
+    return {name: index.to_dict() for name, index in mapps.items()}
+
+
+class MappingIndex(Mapping):
+    """Compact, CSR like, representation of an associative list
+
+    Keys are integer coded by their position in `key_labels`,
+    candidates by their position in `categories`.
+    Candidates of the i-th key are `categories[indices[offsets[i]:offsets[i + 1]]]`.
+    It is a read-only `Mapping`, so it can be used like the dicts returned by `get_mappings`.
+    The `fingerprint` attribute is a content hash set by `get_mapping_index`, used for caching.
+
+    Args:
+        key_labels (numpy.ndarray): unique categories to map from.
+        categories (numpy.ndarray): unique candidate categories.
+        indices (numpy.ndarray): flat integer codes of candidates, grouped by key.
+        offsets (numpy.ndarray): start of the candidates of each key in `indices`, of length `len(key_labels) + 1`.
+        weights (Optional[numpy.ndarray]): probabilities of candidates aligned with `indices`,
+            e.g. combined probabilities from `compose_mappings`. Defaults to None.
+        direction (Optional[str]): "forward" if keys are the newer encoding and candidates the older one,
+            "backward" otherwise, the same meaning as `cat2cat_mappings.direction`. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        key_labels: ndarray,
+        categories: ndarray,
+        indices: ndarray,
+        offsets: ndarray,
+        weights: Optional[ndarray] = None,
+        direction: Optional[str] = None,
+    ) -> None:
+        if len(offsets) != len(key_labels) + 1:
+            raise ValueError("offsets has to be of length len(key_labels) + 1")
+        if len(indices) != offsets[-1]:
+            raise ValueError("indices has to be of length offsets[-1]")
+        if weights is not None and len(weights) != len(indices):
+            raise ValueError("weights has to be aligned with indices")
+        if direction not in (None, "forward", "backward"):
+            raise ValueError('direction has to be one of "forward", "backward" or None')
+        # read-only views, the arrays passed by the caller stay writeable
+        self.key_labels = _readonly(key_labels)
+        self.categories = _readonly(categories)
+        self.indices = _readonly(indices)
+        self.offsets = _readonly(offsets)
+        self.weights = _readonly(weights) if weights is not None else None
+        self.direction = direction
+        self.fingerprint: Optional[str] = None
+        self._index: Optional[Index] = None
+        self._category_index: Optional[Index] = None
+
+    @property
+    def lengths(self) -> ndarray:
+        """Number of candidates for each key."""
+        return diff(self.offsets)
+
+    @property
+    def key_index(self) -> Index:
+        """pandas.Index of keys, used to integer code any categorical values."""
+        if self._index is None:
+            self._index = Index(self.key_labels, dtype=self.key_labels.dtype, tupleize_cols=False)
+        return self._index
+
+    @property
+    def category_index(self) -> Index:
+        """pandas.Index of candidate categories, used to integer code the base period values."""
+        if self._category_index is None:
+            self._category_index = Index(
+                self.categories, dtype=self.categories.dtype, tupleize_cols=False
+            )
+        return self._category_index
+
+    def get_indexer(self, values: Any) -> ndarray:
+        """Integer codes of values, -1 for values which are not keys (NaN matches a NaN key)."""
+        return self.key_index.get_indexer(values)
+
+    def get_category_indexer(self, values: Any) -> ndarray:
+        """Integer codes of values in `categories`, -1 for values which are not candidates."""
+        return self.category_index.get_indexer(values)
+
+    def candidates(self, code: int) -> ndarray:
+        """Candidates of the key with a given integer code."""
+        return self.categories.take(
+            self.indices[self.offsets[code] : self.offsets[code + 1]]
+        )
+
+    def to_dict(self) -> Dict[Any, List[Any]]:
+        """Convert to an associative list like the ones returned by `get_mappings`."""
+        flat = self.categories.take(self.indices).tolist()
+        offsets = self.offsets.tolist()
+        return {
+            k: flat[offsets[i] : offsets[i + 1]]
+            for i, k in enumerate(self.key_labels.tolist())
+        }
+
+    def items(self) -> Iterator[Tuple[Any, List[Any]]]:  # type: ignore[override]
+        flat = self.categories.take(self.indices).tolist()
+        offsets = self.offsets.tolist()
+        for i, k in enumerate(self.key_labels.tolist()):
+            yield k, flat[offsets[i] : offsets[i + 1]]
+
+    def __getitem__(self, key: Any) -> List[Any]:
+        code = self.key_index.get_loc(key)
+        return self.candidates(code).tolist()
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.key_labels.tolist())
+
+    def __len__(self) -> int:
+        return len(self.key_labels)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.key_index
+
+    def __repr__(self) -> str:
+        return "MappingIndex(keys={}, categories={}, pairs={})".format(
+            len(self.key_labels), len(self.categories), len(self.indices)
+        )
+
+
+def _readonly(arr: ndarray) -> ndarray:
+    view = arr.view()
+    view.flags.writeable = False
+    return view
+
+
+def _array_columns(x: ndarray) -> Tuple[ndarray, ndarray]:
+    ff = x[:, 0].copy()
+    ss = x[:, 1].copy()
+
+    if ff.dtype != ss.dtype:
+        raise ValueError("mapping table columns must share the same dtype")
+
+    return ff, ss
+
+
+def _df_columns(x: DataFrame) -> Tuple[ndarray, ndarray]:
     # Use writable numpy buffers. On newer pandas/numpy/python combinations,
     # values extracted from a Series can be read-only and fail on assignment.
     ff = x.iloc[:, 0].to_numpy(copy=True)
@@ -103,74 +409,154 @@ def get_mappings_df(x: DataFrame) -> Dict[str, Dict[Any, List[Any]]]:
         ff[which_ff_null | (ff == None)] = "None"
         ss[which_ss_null | (ss == None)] = "None"
 
-    from_old = list(OrderedDict.fromkeys(ff))
-    from_new = list(OrderedDict.fromkeys(ss))
+    return ff, ss
+
 
-    to_old = dict()
-    for e in from_new:
-        if (col_type in [float, int]) and isnan(e):
-            idx = isnan(ss)
-        else:
-            idx = ss == e
+def _compile_mappings(ff: ndarray, ss: ndarray) -> Dict[str, MappingIndex]:
+    """Build both associative lists from the two columns of a transition table
 
-        # sorted so results are stable
-        to_old[e] = sorted(unique(ff[idx]))
+    Each column is factorized once, so all NaN values share a single code,
+    and the (key, candidate) pairs are deduplicated and ordered with one sort.
+    Keys keep their order of first appearance and candidates are sorted, NaN last.
+    """
+    ff_codes, ff_uniq = _factorize(ff)
+    ss_codes, ss_uniq = _factorize(ss)
+    to_old = _group_candidates(ss_codes, ss_uniq, ff_codes, ff_uniq)
+    to_new = _group_candidates(ff_codes, ff_uniq, ss_codes, ss_uniq)
+    to_old.direction = "forward"
+    to_new.direction = "backward"
+    return dict(to_old=to_old, to_new=to_new)
 
-    to_new = dict()
-    for e in from_old:
-        if (col_type in [float, int]) and isnan(e):
-            idx = isnan(ff)
-        else:
-            idx = ff == e
 
-        # sorted so results are stable
-        to_new[e] = sorted(unique(ss[idx]))
+def _factorize(x: ndarray) -> Tuple[ndarray, ndarray]:
+    """Factorize keeping NaN as a regular value, uniques in order of first appearance"""
+    codes, uniq = factorize(x, use_na_sentinel=False)
+    # pandas puts the NaN value last, move it back to its first appearance
+    _, first = unique(codes, return_index=True)
+    order = argsort(first, kind="stable")
+    recode = empty(len(order), dtype=int64)
+    recode[order] = arange(len(order))
+    return recode[codes], uniq[order]
+
+
+def _sort_order(x: ndarray) -> ndarray:
+    """Stable sort order of the values, mixed types are ordered by the type name and then the value"""
+    try:
+        return argsort(x, kind="stable")
+    except TypeError:
+        keys = [(type(e).__qualname__, e) for e in x]
+        return array(sorted(range(len(keys)), key=keys.__getitem__), dtype=int64)
+
+
+def _group_candidates(
+    key_codes: ndarray, key_uniq: ndarray, cand_codes: ndarray, cand_uniq: ndarray
+) -> MappingIndex:
+    """Group sorted unique candidates per key, keys in order of first appearance"""
+    # sorted so results are stable
+    cand_order = _sort_order(cand_uniq)
+    cand_rank = empty(len(cand_order), dtype=int64)
+    cand_rank[cand_order] = arange(len(cand_order))
+
+    n_cand = max(len(cand_uniq), 1)
+    pairs = unique(key_codes.astype(int64) * n_cand + cand_rank[cand_codes])
+    offsets = concatenate(
+        [[0], cumsum(bincount(pairs // n_cand, minlength=len(key_uniq)))]
+    ).astype(int64)
+
+    return MappingIndex(
+        key_labels=key_uniq,
+        categories=cand_uniq[cand_order],
+        indices=(pairs % n_cand).astype(int32),
+        offsets=offsets,
+    )
 
-    return dict(to_old=to_old, to_new=to_new)
 
 def get_freqs(
-    x: Sequence[Any], multiplier: Optional[Sequence[int]] = None
-) -> Dict[Any, int]:
+    x: Sequence[Any], multiplier: Optional[Sequence[float]] = None
+) -> Dict[Any, Union[int, float]]:
     """
     Getting frequencies from a vector with an optional multiplier
 
     Args:
         x (Sequence[Any]): a list like, categorical variable to summarize.
-        multiplier (Optional[Sequence[int]]): a list like, how many times to repeat certain value, additional weights.
+        multiplier (Optional[Sequence[float]]): a list like, how many times to repeat certain value, additional weights.
                                          Have the same length as the x argument. Defaults to None.
 
     Returns:
-        dict: with unique values and their counts
+        dict: with unique values and their counts, or sums of multiplier.
+        The sums are int for an integer multiplier and float otherwise.
+
+    Note:
+        The multiplier is applied as weights, without repeating the x argument,
+        so the memory use is proportional to the length of x and not to the population size.
 
     >>> get_freqs([1,1,1,2,1,2,2,11])
     {1: 4, 2: 3, 11: 1}
+    >>> get_freqs(["a", "b", "a"], [1.5, 2, 0.5])
+    {'a': 2.0, 'b': 2.0}
     """
     if not isinstance(x, Iterable):
         raise TypeError("x has to be at least a Iterable")
     if multiplier is not None and not isinstance(multiplier, Iterable):
         raise TypeError("multiplier has to be a Iterable")
-    input: ndarray
     if multiplier is not None:
-        input = repeat(x, multiplier)
-    else:
-        input = array(list(x), dtype=object)
+        return _weighted_freqs(x, multiplier)
+    input = array(list(x), dtype=object)
     counts = Series(input, dtype=object).value_counts(dropna=False, sort=False)
     res: dict = counts.astype(int).to_dict()
     return res
 
 
+def _weighted_freqs(x: Iterable[Any], multiplier: Iterable[float]) -> Dict[Any, Any]:
+    """Sum the multiplier per unique value of x with a factorize and a weighted bincount"""
+    values = asarray(x) if isinstance(x, (ndarray, Series)) else array(list(x), dtype=object)
+    weights = asarray(
+        multiplier if isinstance(multiplier, (ndarray, Series)) else list(multiplier)
+    )
+    if values.ndim != 1 or weights.shape != values.shape:
+        raise ValueError("multiplier has to have the same length as x")
+    if weights.dtype.kind not in "biuf":
+        raise TypeError("multiplier has to be numeric")
+    if (weights < 0).any():
+        raise ValueError("multiplier has to be non-negative")
+
+    codes, uniq = factorize(values)
+    uniq = asarray(uniq, dtype=object)
+    missing = codes < 0
+    if missing.any():
+        # None, NaN and pandas.NA are kept as separate categories, like in value_counts
+        miss_values = values[missing]
+        kinds, _ = factorize(array([type(e).__name__ for e in miss_values], dtype=object))
+        _, kinds_first = unique(kinds, return_index=True)
+        codes = codes.copy()
+        codes[missing] = len(uniq) + kinds
+        uniq = concatenate([uniq, asarray(miss_values, dtype=object).take(kinds_first)])
+
+    totals = bincount(codes, weights=weights, minlength=len(uniq))
+    if weights.dtype.kind in "biu":
+        totals = totals.round().astype(int64)
+
+    # order of first appearance, categories with a zero total are skipped like in repeat
+    _, first = unique(codes, return_index=True)
+    order = argsort(first, kind="stable")
+    order = order[totals.take(order) != 0]
+    return dict(zip(uniq.take(order).tolist(), totals.take(order).tolist()))
+
+
 def cat_apply_freq(
-    to_x: Dict[Any, List[Any]], freqs: Dict[Any, int]
+    to_x: Union[Dict[Any, List[Any]], MappingIndex],
+    freqs: Dict[Any, Union[int, float]],
 ) -> Dict[Any, List[float]]:
     """
     Applying frequencies to the object returned by the `get_mappings` function
 
     Args:
-        to_x (Dict[Any, List[Any]]): object returned by `get_mappings` function.
-        freqs (Dict[Any, int]): object like the one returned by the `get_freqs` function.
+        to_x (Dict[Any, List[Any]] or MappingIndex): object returned by `get_mappings` or `get_mapping_index` function.
+        freqs (Dict[Any, Union[int, float]]): object like the one returned by the `get_freqs` function.
 
     Returns:
         Dict[Any, List[float]]: the same shape as the to_x arg but the values are probabilities now.
+        For a `MappingIndex` from `get_mapping_index` results are cached, see `cat2cat.cache.mappings_cache`.
 
     Note:
         freqs arg keys and to_x arg values have to be of the same type
@@ -187,13 +573,266 @@ def cat_apply_freq(
     >>> mapp_new_p['3481']
     [0.0, 0.6, 0.0, 0.4]
     """
-    if not isinstance(to_x, dict):
-        raise TypeError("to_x has to be a dict")
+    if not isinstance(to_x, (dict, MappingIndex)):
+        raise TypeError("to_x has to be a dict or MappingIndex")
     if not isinstance(freqs, dict):
         raise TypeError("freqs has to be dict")
-    res = dict()
-    for x in to_x:
-        cs = [freqs.get(e, 1e-12) for e in to_x[x]]
-        fs = round(array(cs) / sum(cs), 10)
-        res[x] = list(fs)
-    return res
+    if isinstance(to_x, MappingIndex):
+        keys = to_x.key_labels.tolist()
+        offsets = to_x.offsets
+        probs = candidate_probs(to_x, freqs)
+    else:
+        keys = list(to_x.keys())
+        groups = list(to_x.values())
+        offsets = concatenate([[0], cumsum([len(e) for e in groups])]).astype(int64)
+        cs = [freqs.get(e, 1e-12) for cands in groups for e in cands]
+        probs = _normalize_groups(array(cs, dtype=float), offsets)
+
+    flat = probs.tolist()
+    bounds = offsets.tolist()
+    return {x: flat[bounds[i] : bounds[i + 1]] for i, x in enumerate(keys)}
+
+
+def candidate_probs(
+    to_x: MappingIndex, freqs: Union[Dict[Any, Union[int, float]], ndarray]
+) -> ndarray:
+    """Probabilities of all candidates of a `MappingIndex` as one flat array
+
+    Frequencies are looked up once per unique candidate category and normalized
+    to sum to one within each key, with the same `1e-12` floor and rounding as `cat_apply_freq`.
+
+    Args:
+        to_x (MappingIndex): object returned by `get_mapping_index` function.
+        freqs (Dict[Any, Union[int, float]] or numpy.ndarray): object like the one returned by the `get_freqs` function,
+            or frequencies already aligned with `to_x.categories`.
+
+    Returns:
+        numpy.ndarray: read-only probabilities aligned with `to_x.indices`.
+        Results are cached when `to_x` comes from `get_mapping_index`, see `cat2cat.cache.mappings_cache`.
+    """
+    key = None
+    if to_x.fingerprint is not None:
+        key = ("freqs", to_x.fingerprint, fingerprint_freqs(freqs))
+        cached = mappings_cache.get(key)
+        if cached is not None:
+            return cached
+
+    if isinstance(freqs, dict):
+        cat_freqs = array(
+            [freqs.get(e, 1e-12) for e in to_x.categories.tolist()], dtype=float
+        )
+    elif len(freqs) == len(to_x.categories):
+        cat_freqs = asarray(freqs, dtype=float)
+    else:
+        raise ValueError("freqs array has to be aligned with to_x.categories")
+    probs = _normalize_groups(cat_freqs.take(to_x.indices), to_x.offsets)
+    probs.flags.writeable = False
+
+    if key is not None:
+        mappings_cache.put(key, probs)
+    return probs
+
+
+def _normalize_groups(x: ndarray, offsets: ndarray) -> ndarray:
+    """Divide by the segmented sum over groups given by offsets, rounded to 10 digits"""
+    group = repeat(arange(len(offsets) - 1), diff(offsets))
+    # bincount adds the values in order, so it is the same as a sequential sum
+    totals = bincount(group, weights=x, minlength=len(offsets) - 1)
+    return round(x / totals.take(group), 10)
+
+
+def compose_mappings(
+    trans: Sequence[Table],
+    direction: str,
+    freqs: Optional[Sequence[Optional[Dict[Any, Union[int, float]]]]] = None,
+) -> MappingIndex:
+    """Composing transition tables of several classification revisions into one end-to-end mapping
+
+    The mapping of each transition table is turned into a sparse matrix (keys x candidates)
+    and the matrices are multiplied, so a category of the first (or the last) encoding
+    is directly linked with all the reachable categories of the other end of the chain.
+    Intermediate categories without a continuation are dead ends and keys without any reachable category are dropped.
+    The result can be used as `cat2cat_mappings.trans`, so a single replication step is needed.
+
+    Args:
+        trans (Sequence[pandas.DataFrame or numpy.ndarray]): transition tables in chronological order,
+            each with 2 columns where first column is the older encoding,
+            the newer encoding of each table is the older encoding of the next one.
+        direction (str): "forward" maps the newest encoding to the oldest one, "backward" the oldest to the newest.
+        freqs (Optional[Sequence[Optional[Dict[Any, Union[int, float]]]]]): one frequencies dict per transition table,
+            like the one returned by the `get_freqs` function, for the base encoding of that table in the given direction,
+            i.e. the older encoding for "forward" and the newer one for "backward".
+            None for a table means equal probabilities. Defaults to None, no combined probabilities.
+
+    Returns:
+        MappingIndex: end-to-end mapping with combined probabilities in the `weights` attribute when freqs are provided.
+
+    >>> from cat2cat.mappings import compose_mappings
+    >>> from numpy import array
+    >>> t1 = array([["a", "A1"], ["a", "A2"], ["b", "B"]])
+    >>> t2 = array([["A1", "x"], ["A2", "y"], ["A2", "z"], ["B", "z"]])
+    >>> mapp = compose_mappings([t1, t2], "backward", freqs=[{"A1": 1, "A2": 3}, {"x": 1, "y": 1, "z": 2}])
+    >>> mapp.to_dict()
+    {'a': ['x', 'y', 'z'], 'b': ['z']}
+    >>> mapp.weights
+    array([0.25, 0.25, 0.5 , 1.  ])
+    """
+    if not isinstance(trans, Sequence) or isinstance(trans, str) or len(trans) == 0:
+        raise TypeError("trans has to be a non-empty Sequence of transition tables")
+    if direction not in ("forward", "backward"):
+        raise ValueError('direction has to be one of "forward" or "backward"')
+    if freqs is not None:
+        if not isinstance(freqs, Sequence) or len(freqs) != len(trans):
+            raise ValueError("freqs has to be a Sequence of the same length as trans")
+        if not all(f is None or isinstance(f, dict) for f in freqs):
+            raise TypeError("freqs elements have to be dict or None")
+
+    name = "to_old" if direction == "forward" else "to_new"
+    stages = [get_mapping_index(t)[name] for t in trans]
+    stage_freqs = list(freqs) if freqs is not None else [None] * len(trans)
+    if direction == "forward":
+        stages.reverse()
+        stage_freqs.reverse()
+    weighted = freqs is not None
+
+    first = stages[0]
+    structure = _to_csr(first, ones(len(first.indices)))
+    probs = _to_csr(first, _stage_probs(first, stage_freqs[0])) if weighted else None
+    labels = first.categories
+    for stage, stage_f in zip(stages[1:], stage_freqs[1:]):
+        # link candidates of the previous stage with keys of the next one by their labels
+        align = _align_labels(labels, stage)
+        structure = structure @ align @ _to_csr(stage, ones(len(stage.indices)))
+        if weighted:
+            probs = probs @ align @ _to_csr(stage, _stage_probs(stage, stage_f))
+        labels = stage.categories
+
+    structure = structure.tocsr()
+    structure.sort_indices()
+    lengths = diff(structure.indptr)
+    keep = lengths > 0
+    offsets = concatenate([[0], cumsum(lengths[keep])]).astype(int64)
+    indices = structure.indices.astype(int32)
+
+    weights = None
+    if weighted:
+        assert probs is not None
+        rows = repeat(arange(len(lengths)), lengths)
+        # the sparse product skips zero values so they are gathered on the structure
+        w = asarray(probs.tocsr()[rows, structure.indices], dtype=float64).ravel()
+        group = repeat(arange(len(offsets) - 1), diff(offsets))
+        totals = bincount(group, weights=w, minlength=len(offsets) - 1)
+        # keys only reachable through zero probabilities get equal ones
+        w = where(totals.take(group) > 0, w, 1.0)
+        weights = _normalize_groups(w, offsets)
+
+    return MappingIndex(
+        key_labels=first.key_labels[keep],
+        categories=labels.copy(),
+        indices=indices,
+        offsets=offsets,
+        weights=weights,
+        direction=direction,
+    )
+
+
+def get_mapping_matrix(
+    to_x: Union[Dict[Any, List[Any]], MappingIndex],
+    probs: Optional[Union[Dict[Any, List[float]], ndarray]] = None,
+) -> Tuple[Any, ndarray, ndarray]:
+    """Sparse matrix representation of an associative list and its probabilities
+
+    Rows are keys and columns are candidate categories, so `to_new` gives an (old codes x new codes) matrix.
+    Expected counts in the other encoding are a single product, `counts @ matrix`,
+    and mappings can be checked or composed with plain linear algebra, without replicating observations.
+
+    Args:
+        to_x (Dict[Any, List[Any]] or MappingIndex): object returned by `get_mappings` or `get_mapping_index` function.
+        probs (Optional[Union[Dict[Any, List[float]], numpy.ndarray]]): object returned by `cat_apply_freq` function for to_x,
+            or a flat array aligned with `to_x.indices` like the one returned by `candidate_probs`.
+            Defaults to None, `to_x.weights` if available, otherwise ones marking the possible matches.
+
+    Returns:
+        Tuple[scipy.sparse.csr_matrix, numpy.ndarray, numpy.ndarray]: the matrix, row labels (keys) and column labels (categories).
+
+    >>> from cat2cat.mappings import get_mappings, cat_apply_freq, get_mapping_matrix
+    >>> from numpy import array
+    >>> mappings = get_mappings(array([["a", "x"], ["a", "y"], ["b", "y"]]))
+    >>> probs = cat_apply_freq(mappings["to_new"], {"x": 1, "y": 3})
+    >>> matrix, rows, cols = get_mapping_matrix(mappings["to_new"], probs)
+    >>> matrix.toarray()
+    array([[0.25, 0.75],
+           [0.  , 1.  ]])
+    >>> rows.tolist(), cols.tolist()
+    (['a', 'b'], ['x', 'y'])
+    >>> array([10, 2]) @ matrix
+    array([2.5, 9.5])
+    """
+    if isinstance(to_x, MappingIndex):
+        index = to_x
+    elif isinstance(to_x, dict):
+        index = _index_from_dict(to_x)
+    else:
+        raise TypeError("to_x has to be a dict or MappingIndex")
+
+    if probs is None:
+        data = index.weights if index.weights is not None else ones(len(index.indices))
+    elif isinstance(probs, dict):
+        # cat_apply_freq keeps the order of keys
+        groups = list(probs.values())
+        if len(groups) != len(index) or not all(
+            len(g) == n for g, n in zip(groups, index.lengths.tolist())
+        ):
+            raise ValueError("probs has to have the same shape as to_x")
+        data = array([p for g in groups for p in g], dtype=float)
+    elif isinstance(probs, ndarray):
+        if len(probs) != len(index.indices):
+            raise ValueError("probs array has to be aligned with to_x.indices")
+        data = probs
+    else:
+        raise TypeError("probs has to be a dict, numpy.ndarray or None")
+
+    return _to_csr(index, asarray(data, dtype=float)), index.key_labels, index.categories
+
+
+def _index_from_dict(to_x: Dict[Any, List[Any]]) -> MappingIndex:
+    """MappingIndex keeping the order of keys and candidates of an associative list"""
+    groups = list(to_x.values())
+    flat = Series([e for g in groups for e in g], dtype=object).to_numpy()
+    codes, categories = _factorize(flat)
+    offsets = concatenate([[0], cumsum([len(g) for g in groups])]).astype(int64)
+    return MappingIndex(
+        key_labels=Series(list(to_x.keys()), dtype=object).to_numpy(),
+        categories=categories,
+        indices=codes.astype(int32),
+        offsets=offsets,
+    )
+
+
+def _stage_probs(
+    to_x: MappingIndex, freqs: Optional[Dict[Any, Union[int, float]]]
+) -> ndarray:
+    if freqs is None:
+        return _normalize_groups(ones(len(to_x.indices)), to_x.offsets)
+    return candidate_probs(to_x, freqs)
+
+
+def _to_csr(to_x: MappingIndex, data: ndarray) -> Any:
+    from scipy.sparse import csr_matrix
+
+    return csr_matrix(
+        (data, to_x.indices, to_x.offsets),
+        shape=(len(to_x.key_labels), len(to_x.categories)),
+    )
+
+
+def _align_labels(labels: ndarray, to_x: MappingIndex) -> Any:
+    """0/1 matrix linking labels with the same keys of to_x"""
+    from scipy.sparse import csr_matrix
+
+    pos = to_x.get_indexer(labels)
+    found = pos >= 0
+    return csr_matrix(
+        (ones(int(found.sum())), (arange(len(labels))[found], pos[found])),
+        shape=(len(labels), len(to_x.key_labels)),
+    )
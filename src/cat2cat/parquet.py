@@ -0,0 +1,124 @@
+import glob
+import os
+from typing import Any, Dict, Optional
+
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+from cat2cat.cat2cat import _check_args, _prepare, _expand, _dummy_base
+
+__all__ = ["cat2cat_parquet"]
+
+
+def cat2cat_parquet(
+    old: Any,
+    new: Any,
+    out: str,
+    mappings: cat2cat_mappings,
+    cat_var_old: str,
+    cat_var_new: str,
+    time_var: str,
+    id_var: Optional[str] = None,
+    multiplier_var: Optional[str] = None,
+    ml: Optional[cat2cat_ml] = None,
+    batch_size: int = 1_000_000,
+    input_format: str = "parquet",
+) -> Dict[str, str]:
+    """File to file cat2cat procedure for Parquet or Arrow datasets
+
+    Both periods are read batch by batch with `pyarrow.dataset`, only the columns needed
+    for the base period frequencies (and the direct matching) are read at once.
+    Each batch is replicated as in `cat2cat_stream` and written straight to Parquet,
+    so full pandas frames of the periods are never held.
+    The g_new_c2c column is dictionary encoded, with one dictionary shared by all files of both periods.
+
+    Args:
+        old (Any): older time point, a path, a list of paths or a directory accepted by `pyarrow.dataset.dataset`.
+        new (Any): newer time point, the same as old.
+        out (str): output directory, the result is partitioned by period into the `out/old` and `out/new` directories
+            with one `part-(number).parquet` file for each batch.
+        mappings (cat2cat_mappings): dataclass with mappings related arguments.
+        cat_var_old (str): name of the categorical variable in the older time point.
+        cat_var_new (str): name of the categorical variable in the newer time point.
+        time_var (str): name of the time variable.
+        id_var (Optional[str]): name of the unique identifier variable. Defaults to None.
+        multiplier_var (Optional[str]): name of the multiplier variable. Defaults to None.
+        ml (Optional[cat2cat_ml]): dataclass with ml related arguments. Models are fitted for each batch.
+        batch_size (int): maximum number of input rows in a batch. Defaults to 1_000_000.
+        input_format (str): input format, "parquet", "arrow" (Arrow IPC/Feather) or any other `pyarrow.dataset` format.
+            Defaults to "parquet".
+
+    Returns:
+        dict: output directories of the old and new periods.
+        Read back with e.g. `pandas.read_parquet(res["old"])`, which gives the same columns as `cat2cat(..., categorical=True)`.
+
+    Note:
+        pyarrow is required, install it with `pip install cat2cat[arrow]`.
+        Output directories are created and their existing part files are removed first,
+        so a rerun with fewer batches does not leave stale parts of the previous run.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("pyarrow is required for cat2cat_parquet") from exc
+
+    if not isinstance(mappings, cat2cat_mappings):
+        raise TypeError("mappings arg has to be cat2cat_mappings instance")
+    if not isinstance(out, str):
+        raise TypeError("out arg has to be a str")
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError("batch_size arg has to be a positive int")
+
+    sources = {
+        "old": ds.dataset(old, format=input_format),
+        "new": ds.dataset(new, format=input_format),
+    }
+    cat_vars = {"old": cat_var_old, "new": cat_var_new}
+    base_name = "old" if mappings.direction == "forward" else "new"
+    target_name = "new" if base_name == "old" else "old"
+
+    # only the columns needed for the frequencies, the categorical dictionary and the direct matching
+    slim = dict()
+    for period, source in sources.items():
+        needed = [time_var, cat_vars[period], id_var, multiplier_var]
+        if period == base_name:
+            needed += ["g_new_c2c", "wei_freq_c2c"]
+        columns = [
+            c for c in dict.fromkeys(needed) if c is not None and c in source.schema.names
+        ]
+        if period == base_name:
+            slim[period] = source.to_table(columns=columns).to_pandas()
+        else:
+            slim[period] = source.head(1, columns=columns).to_pandas()
+
+    data = cat2cat_data(
+        old=slim["old"],
+        new=slim["new"],
+        cat_var_old=cat_var_old,
+        cat_var_new=cat_var_new,
+        time_var=time_var,
+        id_var=id_var,
+        multiplier_var=multiplier_var,
+    )
+    _check_args(data, mappings, ml, True)
+    plan = _prepare(data, mappings, ml, True, copy=False)
+
+    res = dict()
+    for period in (base_name, target_name):
+        res[period] = os.path.join(out, period)
+        os.makedirs(res[period], exist_ok=True)
+        for stale in glob.glob(os.path.join(res[period], "part-*.parquet")):
+            os.remove(stale)
+        offset = 0
+        batches = sources[period].to_batches(batch_size=batch_size)
+        for i, batch in enumerate(batches):
+            df = batch.to_pandas()
+            if period == base_name:
+                df = _dummy_base(plan, df, offset)
+            else:
+                df = _expand(plan, df, offset)
+            offset += batch.num_rows
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(table, os.path.join(res[period], "part-{:05d}.parquet".format(i)))
+
+    return res
@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Tuple
+
+from numpy import ndarray
+from pandas import DataFrame
+
+__all__ = ["cat2cat_sparse"]
+
+
+class cat2cat_sparse:
+    """Not replicated target period returned by `cat2cat(..., output="sparse")`
+
+    The target period observations are kept as they are and the cat2cat weights
+    are stored as `scipy.sparse` CSR matrices, one row for each observation and
+    one column for each candidate category.
+    The memory follows the number of observations times the number of candidates,
+    not the replicated frame with all its columns.
+    Weighted sums per category are then `matrix.T @ values`.
+
+    Args:
+        data (DataFrame): target period observations, not replicated, in the matrix rows order.
+        weights (Dict[str, scipy.sparse.csr_matrix]): weights matrices, like wei_naive_c2c, wei_freq_c2c and wei_(ml method name)_c2c.
+        categories (numpy.ndarray): labels of the matrix columns.
+
+    >>> from cat2cat import cat2cat
+    >>> from cat2cat.dataclass import cat2cat_data, cat2cat_mappings
+    >>> from cat2cat.datasets import load_trans, load_occup
+    >>> occup = load_occup()
+    >>> o_old = occup.loc[occup.year == 2008, :]
+    >>> data = cat2cat_data(o_old, occup.loc[occup.year == 2010, :], "code", "code", "year")
+    >>> res = cat2cat(data, cat2cat_mappings(load_trans(), "backward"), output="sparse")
+    >>> res["old"]["wei_freq_c2c"].shape == (len(o_old), len(res["old"].categories))
+    True
+    >>> bool(abs(res["old"]["wei_freq_c2c"].sum() - len(o_old)) < 1e-6)
+    True
+    """
+
+    def __init__(self, data: DataFrame, weights: Dict[str, Any], categories: ndarray) -> None:
+        for name, matrix in weights.items():
+            if matrix.shape != (len(data), len(categories)):
+                raise ValueError("{} has to be an (observations x categories) matrix".format(name))
+        self.data = data
+        self.weights = weights
+        self.categories = categories
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the weights matrices."""
+        return list(self.weights.keys())
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.data), len(self.categories)
+
+    @property
+    def rep(self) -> ndarray:
+        """Number of candidate categories of each observation, the rep_c2c column."""
+        return self.weights["wei_naive_c2c"].getnnz(axis=1)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.weights[key]
+
+    def __repr__(self) -> str:
+        return "cat2cat_sparse(observations={}, categories={}, weights={})".format(
+            len(self.data), len(self.categories), self.names
+        )
@@ -0,0 +1,158 @@
+import json
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+from numpy import load, ndarray, result_type
+from numpy.lib.format import open_memmap
+from pandas import (
+    Categorical,
+    CategoricalDtype,
+    DataFrame,
+    Index,
+    RangeIndex,
+    Series,
+    read_pickle,
+    to_pickle,
+)
+
+__all__ = ["load_spill"]
+
+SPILL_FORMAT = "cat2cat.spill"
+SPILL_VERSION = 1
+
+
+def load_spill(path: str, mmap: bool = True) -> DataFrame:
+    """Loading a replicated frame kept by `cat2cat(..., spill=cat2cat_spill(path, keep=True))`
+
+    Args:
+        path (str): directory with the spilled frame.
+        mmap (bool): if True the columns are memory-mapped read-only, otherwise they are read to the memory.
+            Defaults to True.
+
+    Returns:
+        DataFrame: the same frame as returned by the `cat2cat` call.
+
+    >>> import tempfile
+    >>> from cat2cat import cat2cat
+    >>> from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_spill
+    >>> from cat2cat.datasets import load_trans, load_occup
+    >>> occup = load_occup()
+    >>> data = cat2cat_data(occup.loc[occup.year == 2008, :], occup.loc[occup.year == 2010, :],
+    ...                     "code", "code", "year")
+    >>> path = tempfile.mkdtemp()
+    >>> res = cat2cat(data, cat2cat_mappings(load_trans(), "backward"), spill=cat2cat_spill(path, keep=True))
+    >>> load_spill(path).equals(res["old"])
+    True
+    """
+    if not isinstance(path, str):
+        raise TypeError("path has to be a str")
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format") != SPILL_FORMAT or meta.get("version") != SPILL_VERSION:
+        raise ValueError("path is not a spilled cat2cat frame of a supported version")
+
+    res: Dict[Any, Any] = dict()
+    for col in meta["columns"]:
+        file = os.path.join(path, col["file"])
+        if col["kind"] == "memory":
+            res[col["name"]] = read_pickle(file)
+            continue
+        values = load(file, mmap_mode="r" if mmap else None).view(ndarray)
+        if col["kind"] == "categorical":
+            values = Categorical.from_codes(values, dtype=read_pickle(file + ".dtype.pkl"))
+        res[col["name"]] = values
+    axes = read_pickle(os.path.join(path, "axes.pkl"))
+    return _frame(res, axes["index"], axes["columns"])
+
+
+def _spill_expanded(
+    expanded: Any, path: str, keep: bool = False, chunksize: int = 1_000_000
+) -> DataFrame:
+    """Materialize a `cat2cat_expanded` object to memory-mapped files, column by column
+
+    Returns the same frame as `expanded.to_frame()`, backed by the files.
+    """
+    os.makedirs(path, exist_ok=True)
+    n_rep = len(expanded.rows)
+    tail = expanded.tail
+    index = RangeIndex(n_rep) if tail is None else RangeIndex(n_rep).append(tail.index)
+
+    res: Dict[Any, Any] = dict()
+    meta: List[Dict[str, Any]] = []
+    for i, name in enumerate(expanded.columns):
+        file = "{:04d}.npy".format(i)
+        in_c2c = name in expanded.c2c.columns
+        head = expanded.c2c[name] if in_c2c else expanded.data[name]
+        kind, dtype = _spill_kind(head, tail[name] if tail is not None else None)
+        if kind == "memory":
+            column = expanded.to_frame([name])[name]
+            if in_c2c and column.dtype == object:
+                # the cat2cat columns are inferred by pandas, as in the eager output
+                column = Series(column.to_numpy())
+            values = column.array
+            if keep:
+                to_pickle(values, os.path.join(path, file))
+            res[name] = values
+            meta.append(dict(name=name, file=file, kind=kind))
+            continue
+
+        mm = open_memmap(os.path.join(path, file), mode="w+", dtype=dtype, shape=(len(index),))
+        src = _codes(head)
+        for start in range(0, n_rep, chunksize):
+            stop = min(start + chunksize, n_rep)
+            mm[start:stop] = src[start:stop] if in_c2c else src.take(expanded.rows[start:stop])
+        if tail is not None:
+            mm[n_rep:] = _codes(tail[name])
+        mm.flush()
+        if keep:
+            if kind == "categorical":
+                to_pickle(head.dtype, os.path.join(path, file + ".dtype.pkl"))
+        else:
+            # the mapping stays valid, the space is freed when it is released
+            os.remove(os.path.join(path, file))
+        # a plain ndarray view, backed by the mapped file
+        values = mm.view(ndarray)
+        res[name] = (
+            Categorical.from_codes(values, dtype=head.dtype) if kind == "categorical" else values
+        )
+        meta.append(dict(name=name, file=file, kind=kind))
+
+    columns = Index(expanded.columns, dtype=expanded.data.columns.dtype)
+    if keep:
+        to_pickle(dict(index=index, columns=columns), os.path.join(path, "axes.pkl"))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(
+                dict(format=SPILL_FORMAT, version=SPILL_VERSION, nrow=len(index), columns=meta), f
+            )
+    return _frame(res, index, columns)
+
+
+def _frame(res: Dict[Any, Any], index: Index, columns: Index) -> DataFrame:
+    """A frame of the columns without copying them"""
+    frame = DataFrame(res, index=index, copy=False)
+    for name, values in res.items():
+        # object columns of strings are inferred as the str dtype by the constructor
+        if frame[name].dtype != values.dtype:
+            frame[name] = frame[name].astype(values.dtype)
+    frame.columns = columns
+    return frame
+
+
+def _spill_kind(head: Series, tail: Any) -> Any:
+    """How a column is spilled, "array", "categorical" or "memory", and the dtype of its file"""
+    if isinstance(head.dtype, CategoricalDtype):
+        if tail is None or tail.dtype == head.dtype:
+            return "categorical", head.cat.codes.dtype
+        return "memory", None
+    dtypes = [head.dtype] + ([tail.dtype] if tail is not None else [])
+    if not all(isinstance(d, np.dtype) and d.kind in "biufcmM" for d in dtypes):
+        return "memory", None
+    # numpy and pandas upcast the bool mixed with numbers differently
+    if len({d.kind == "b" for d in dtypes}) > 1:
+        return "memory", None
+    return "array", result_type(*dtypes)
+
+
+def _codes(x: Series) -> ndarray:
+    return x.cat.codes.to_numpy() if isinstance(x.dtype, CategoricalDtype) else x.to_numpy()
@@ -0,0 +1,137 @@
+from cat2cat import cat2cat
+from cat2cat.cache import (
+    MappingsCache,
+    ModelCache,
+    mappings_cache,
+    fingerprint_freqs,
+    fingerprint_table,
+)
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+from cat2cat.mappings import get_mapping_index, get_freqs, cat_apply_freq
+from cat2cat.datasets import load_trans, load_occup
+from pandas import DataFrame, Series
+from pandas.testing import assert_frame_equal
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+import pickle
+import pytest
+
+trans = load_trans()
+
+
+def test_mappings_cache_lru():
+    cache = MappingsCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2, "maxsize": 2}
+    cache.maxsize = 1
+    assert len(cache) == 1
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0, "maxsize": 1}
+
+
+def test_mappings_cache_off():
+    cache = MappingsCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+@pytest.mark.parametrize("maxsize", [-1, 1.5, "1"])
+def test_mappings_cache_wrong_maxsize(maxsize):
+    with pytest.raises(ValueError):
+        MappingsCache(maxsize=maxsize)
+
+
+def test_fingerprint_table():
+    assert fingerprint_table(trans) == fingerprint_table(trans.copy())
+    assert fingerprint_table(trans) != fingerprint_table(trans.iloc[:-1, :])
+    assert fingerprint_table(trans) != fingerprint_table(trans.iloc[:, ::-1])
+
+
+def test_fingerprint_mixed_types():
+    assert fingerprint_freqs({"1": 1, 2: 3}) != fingerprint_freqs({1: 1, "2": 3})
+    assert fingerprint_freqs({"1": 1, 2: 3}) == fingerprint_freqs({"1": 1, 2: 3})
+    x = DataFrame({"old": ["1", 2], "new": ["a", "b"]})
+    y = DataFrame({"old": [1, "2"], "new": ["a", "b"]})
+    assert fingerprint_table(x) != fingerprint_table(y)
+
+
+def test_get_mapping_index_cached():
+    mappings_cache.clear()
+    first = get_mapping_index(trans)
+    second = get_mapping_index(trans.copy())
+    assert first["to_old"] is second["to_old"]
+    assert mappings_cache.stats()["hits"] == 1
+    assert mappings_cache.stats()["misses"] == 1
+
+
+def test_cat_apply_freq_cached():
+    mappings_cache.clear()
+    mapp = get_mapping_index(trans)["to_new"]
+    freqs = get_freqs(trans["new"].values)
+    first = cat_apply_freq(mapp, freqs)
+    first["3481"][0] = 100
+    second = cat_apply_freq(mapp, freqs)
+    assert second["3481"][0] != 100
+    assert mappings_cache.stats()["hits"] == 1
+
+
+def test_model_cache(tmp_path):
+    X = DataFrame({"a": [1.0, 2.0, 3.0, 4.0], "b": [0, 1, 0, 1]})
+    y = Series(["x", "y", "x", "y"])
+    cache = ModelCache(str(tmp_path))
+    model = GaussianNB().fit(X, y)
+    key = cache.key(X, y, GaussianNB())
+
+    assert cache.get(key) is None
+    cache.put(key, model)
+    assert cache.get(key).predict(X).tolist() == model.predict(X).tolist()
+    assert key == cache.key(X.copy(), y.copy(), GaussianNB())
+    assert key != cache.key(X, y, GaussianNB(var_smoothing=1e-3))
+    assert key != cache.key(X[["b", "a"]], y, GaussianNB())
+    assert key != cache.key(X, y.iloc[::-1].reset_index(drop=True), GaussianNB())
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    # a new object for the same directory, like in a later run
+    assert len(ModelCache(str(tmp_path))) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_model_cache_lru(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    for key in ["a", "b", "c"]:
+        cache.put(key, list(range(100)))
+    size = cache.stats()["bytes"] // 3
+    cache.get("a")
+    cache.max_bytes = 2 * size
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert pickle.loads(pickle.dumps(cache)).stats()["entries"] == 2
+
+    with pytest.raises(ValueError):
+        ModelCache(str(tmp_path), max_bytes=-1)
+
+
+def test_cat2cat_model_cache(tmp_path):
+    occup = load_occup(small=True)
+    o_old = occup.loc[occup.year == 2008, :]
+    o_new = occup.loc[occup.year == 2010, :]
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    cache = ModelCache(str(tmp_path))
+    models = [DecisionTreeClassifier(random_state=1234)]
+    ml = cat2cat_ml(o_new, "code", ["salary", "age"], models, fail_warn=False)
+    ml_cached = cat2cat_ml(o_new, "code", ["salary", "age"], models, fail_warn=False, cache=cache)
+
+    expected = cat2cat(data, mappings, ml)["old"]
+    assert_frame_equal(cat2cat(data, mappings, ml_cached)["old"], expected)
+    misses = cache.stats()["misses"]
+    assert misses > 0
+    assert_frame_equal(cat2cat(data, mappings, ml_cached)["old"], expected)
+    assert cache.stats()["misses"] == misses
@@ -1,8 +1,11 @@
 from cat2cat.datasets import load_trans, load_occup, load_verticals
 from cat2cat import cat2cat
+from cat2cat.cat2cat import cat2cat_stream, cat2cat_panel, cat2cat_parallel
 from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
 from cat2cat.cat2cat_utils import dummy_c2c
+from cat2cat.mappings import compose_mappings
 from pandas import concat, DataFrame
+from pandas.testing import assert_frame_equal
 from numpy import round, setdiff1d, nan
 import pytest
 from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
@@ -236,6 +239,136 @@ def test_cat2cat_multi():
     ]
 
 
+def test_cat2cat_multi_multiplier():
+    data = cat2cat_data(o_2008, o_2010, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    first = cat2cat(data, mappings)
+
+    data = cat2cat_data(
+        o_2006, first["old"], "code", "g_new_c2c", "year", multiplier_var="multiplier"
+    )
+    second = cat2cat(data, mappings)
+
+    freqs = {}
+    for cat, wei, mult in first["old"][["g_new_c2c", "wei_freq_c2c", "multiplier"]].values:
+        freqs[cat] = freqs.get(cat, 0) + wei * mult
+    expected = cat2cat(data, cat2cat_mappings(trans, "backward", freqs))
+
+    assert int_round(second["old"]["wei_freq_c2c"].sum()) == o_2006.shape[0]
+    assert (
+        (second["old"]["wei_freq_c2c"] - expected["old"]["wei_freq_c2c"]).abs().max()
+        < 1e-9
+    )
+
+
+def test_cat2cat_composed():
+    trans_a = DataFrame({"old": ["a", "a", "b"], "new": ["A1", "A2", "B"]})
+    trans_b = DataFrame({"old": ["A1", "A2", "A2", "B"], "new": ["x", "y", "z", "z"]})
+    old = DataFrame({"code": ["a", "a", "b"], "year": 2000})
+    new = DataFrame({"code": ["x", "y", "y", "z"], "year": 2020})
+    mapp = compose_mappings(
+        [trans_a, trans_b], "backward", freqs=[{"A1": 1, "A2": 3}, None]
+    )
+
+    data = cat2cat_data(old, new, "code", "code", "year")
+    res = cat2cat(data, cat2cat_mappings(mapp, "backward"))
+    assert res["old"]["g_new_c2c"].tolist() == ["x", "y", "z"] * 2 + ["z"]
+    assert res["old"]["wei_freq_c2c"].tolist() == [0.25, 0.375, 0.375] * 2 + [1.0]
+
+    # provided freqs take precedence over the combined probabilities
+    res = cat2cat(data, cat2cat_mappings(mapp, "backward", {"x": 1, "y": 1, "z": 2}))
+    assert res["old"]["wei_freq_c2c"].tolist() == [0.25, 0.25, 0.5] * 2 + [1.0]
+
+
+def test_cat2cat_replication():
+    trans_t = DataFrame({"old": ["a", "a", "b", "c"], "new": ["x", "y", "y", "z"]})
+    old = DataFrame({"code": ["b", "q", "a", "c", "a"], "year": 2000})
+    new = DataFrame({"code": ["x", "y", "y", "z"], "year": 2020})
+    data = cat2cat_data(old, new, "code", "code", "year")
+    res = cat2cat(data, cat2cat_mappings(trans_t, "backward"))["old"]
+
+    # q has no candidates so it is removed
+    assert res["index_c2c"].tolist() == [0, 2, 2, 3, 4, 4]
+    assert res["g_new_c2c"].tolist() == ["y", "x", "y", "z", "x", "y"]
+    assert res["rep_c2c"].tolist() == [1, 2, 2, 1, 2, 2]
+    assert res["wei_freq_c2c"].round(4).tolist() == [1.0, 0.3333, 0.6667, 1.0, 0.3333, 0.6667]
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+def test_cat2cat_categorical(direction):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, direction)
+    expected = cat2cat(data, mappings)
+    actual = cat2cat(data, mappings, categorical=True)
+
+    categories = actual["old"]["g_new_c2c"].cat.categories
+    for period in ["old", "new"]:
+        g_new = actual[period]["g_new_c2c"]
+        assert g_new.dtype == "category"
+        assert g_new.cat.categories.equals(categories)
+        assert g_new.astype(object).equals(expected[period]["g_new_c2c"].astype(object))
+        assert actual[period].drop(columns="g_new_c2c").equals(
+            expected[period].drop(columns="g_new_c2c")
+        )
+
+    # a categorical result can be chained
+    data = cat2cat_data(o_2006, actual["old"], "code", "g_new_c2c", "year")
+    chained = cat2cat(data, cat2cat_mappings(trans, "backward"), categorical=True)
+    assert int_round(chained["old"]["wei_freq_c2c"].sum()) == o_2006.shape[0]
+
+
+def test_cat2cat_direct_index():
+    vert_old = verticals.loc[verticals["v_date"] == "2020-04-01", :]
+    vert_new = verticals.loc[verticals["v_date"] == "2020-05-01", :]
+    trans_v = (
+        vert_old.merge(vert_new, on="ean", how="inner")
+        .loc[:, ["vertical_x", "vertical_y"]]
+        .drop_duplicates()
+    )
+    data = cat2cat_data(
+        vert_old, vert_new, "vertical", "vertical", "v_date", id_var="ean"
+    )
+    res = cat2cat(data, cat2cat_mappings(trans_v, "backward"))["old"]
+
+    # direct matches keep their position in the target period
+    assert sorted(res["index_c2c"].unique()) == list(range(vert_old.shape[0]))
+    assert res.groupby("index_c2c")["ean"].nunique().eq(1).all()
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_cat2cat_direct_duplicated(categorical):
+    old = DataFrame({"id": [1, 1, 2, 3, nan], "code": ["a", "a", "b", "c", "a"], "year": 1})
+    new = DataFrame({"id": [1, 1, 2, nan], "code": ["X", "Y", "Z", "X"], "year": 2})
+    trans_d = DataFrame({"old": ["a", "b", "c"], "new": ["X", "Y", "Z"]})
+    data = cat2cat_data(old, new, "code", "code", "year", id_var="id")
+    res = cat2cat(data, cat2cat_mappings(trans_d, "backward"), categorical=categorical)
+
+    # the last base observation of a duplicated id is used for all its target observations
+    direct = res["old"].iloc[-3:]
+    assert direct["index_c2c"].tolist() == [0, 1, 2]
+    assert direct["g_new_c2c"].astype(str).tolist() == ["Y", "Y", "Z"]
+    # ids not in the base period and missing ids are replicated
+    assert res["old"]["index_c2c"].tolist()[:2] == [3, 4]
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+@pytest.mark.parametrize("id_var", [None, "id"])
+def test_cat2cat_copy(direction, id_var):
+    base = "new" if direction == "backward" else "old"
+    data = cat2cat_data(o_old, o_new, "code", "code", "year", id_var=id_var)
+    mappings = cat2cat_mappings(trans, direction)
+    columns = list(getattr(data, base).columns)
+    res = cat2cat(data, mappings)
+    res_lean = cat2cat(data, mappings, copy=False)
+
+    # the caller frame does not get the cat2cat columns
+    assert list(getattr(data, base).columns) == columns
+    for period in ["old", "new"]:
+        assert_frame_equal(res_lean[period], res[period])
+    with pytest.raises(TypeError):
+        cat2cat(data, mappings, copy="no")
+
+
 def test_cat2cat_direct():
     vert_old = verticals.loc[verticals["v_date"] == "2020-04-01", :]
     vert_new = verticals.loc[verticals["v_date"] == "2020-05-01", :]
@@ -291,3 +424,184 @@ def test_cat2cat_direct():
     # test that cat2cat not influence the original data
     assert vert_old.equals(verticals.loc[verticals["v_date"] == "2020-04-01", :])
     assert vert_new.equals(verticals.loc[verticals["v_date"] == "2020-05-01", :])
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+def test_cat2cat_stream(direction):
+    target = "old" if direction == "backward" else "new"
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, direction)
+    expected = cat2cat(data, mappings, categorical=True)
+
+    target_df = getattr(data, target)
+    chunks = [target_df.iloc[i : i + 5000] for i in range(0, len(target_df), 5000)]
+    res = list(cat2cat_stream(data, mappings, iter(chunks), categorical=True))
+
+    assert [name for name, _ in res] == [("new" if target == "old" else "old")] + [
+        target
+    ] * len(chunks)
+    assert res[0][1].equals(expected[res[0][0]])
+    actual = concat([df for _, df in res[1:]], ignore_index=True)
+    assert actual.equals(expected[target].reset_index(drop=True))
+
+
+def test_cat2cat_stream_direct():
+    vert_old = verticals.loc[verticals["v_date"] == "2020-04-01", :]
+    vert_new = verticals.loc[verticals["v_date"] == "2020-05-01", :]
+    trans_v = (
+        vert_old.merge(vert_new, on="ean", how="inner")
+        .loc[:, ["vertical_x", "vertical_y"]]
+        .drop_duplicates()
+    )
+    data = cat2cat_data(
+        vert_old, vert_new, "vertical", "vertical", "v_date", id_var="ean"
+    )
+    mappings = cat2cat_mappings(trans_v, "backward")
+    expected = cat2cat(data, mappings)["old"]
+
+    chunks = [vert_old.iloc[i : i + 7] for i in range(0, len(vert_old), 7)]
+    actual = concat([df for name, df in cat2cat_stream(data, mappings, chunks)][1:])
+
+    # index_c2c is the position in the target period, unique across chunks and direct matches
+    assert actual.groupby("index_c2c")["wei_freq_c2c"].sum().round(8).eq(1).all()
+    assert actual["index_c2c"].nunique() == vert_old.shape[0]
+    key = ["index_c2c", "g_new_c2c"]
+    assert_frame_equal(
+        actual.sort_values(key).reset_index(drop=True),
+        expected.sort_values(key).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_cat2cat_stream_wrong():
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    with pytest.raises(TypeError):
+        cat2cat_stream(data, mappings, o_old)
+    with pytest.raises(TypeError):
+        list(cat2cat_stream(data, mappings, [o_old, 1]))
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+@pytest.mark.parametrize("categorical", [False, True])
+def test_cat2cat_panel(direction, categorical):
+    res = cat2cat_panel(
+        occup, "code", "year", trans, 2010, direction, categorical=categorical
+    )
+    assert list(res.keys()) == [2006, 2008, 2010, 2012]
+
+    # each period is the same as from cat2cat with the base period
+    mappings = cat2cat_mappings(trans, direction)
+    if direction == "backward":
+        for period, o in [(2006, o_2006), (2008, o_2008)]:
+            data = cat2cat_data(o, o_2010, "code", "code", "year")
+            expected = cat2cat(data, mappings, categorical=categorical)
+            assert_frame_equal(res[period], expected["old"], check_categorical=False)
+        assert_frame_equal(res[2010], expected["new"], check_categorical=False)
+    else:
+        for period, o in [(2010, o_2010), (2012, o_2012)]:
+            data = cat2cat_data(o_2008, o, "code", "code", "year")
+            expected = cat2cat(data, mappings, categorical=categorical)
+            assert_frame_equal(res[period], expected["new"], check_categorical=False)
+        assert_frame_equal(res[2008], expected["old"], check_categorical=False)
+
+    if categorical:
+        # one dictionary for all periods
+        assert concat(list(res.values()))["g_new_c2c"].dtype == "category"
+
+
+def test_cat2cat_panel_composed():
+    codes = trans["new"].unique()
+    identity = DataFrame({"old": codes, "new": codes})
+    res = cat2cat_panel(occup, "code", "year", [trans, identity], [2010, 2012], "backward")
+    res_threads = cat2cat_panel(
+        occup, "code", "year", [trans, identity], [2010, 2012], "backward", n_jobs=2
+    )
+
+    single = cat2cat(
+        cat2cat_data(o_2008, o_2010, "code", "code", "year"),
+        cat2cat_mappings(trans, "backward"),
+    )
+    assert res[2008].shape[0] == single["old"].shape[0]
+    assert all(res[2008].groupby("index_c2c")["wei_freq_c2c"].sum().round(6) == 1)
+    assert all(res[2012]["wei_freq_c2c"] == 1)
+    for period in res:
+        assert_frame_equal(res_threads[period], res[period])
+
+
+def test_cat2cat_panel_array():
+    panel = occup.loc[occup.year <= 2010, :]
+    res = cat2cat_panel(panel, "code", "year", trans, 2010, "backward")
+    res_array = cat2cat_panel(panel, "code", "year", trans.values, 2010, "backward")
+    for period in res:
+        assert_frame_equal(res_array[period], res[period])
+
+
+def test_cat2cat_panel_wrong():
+    with pytest.raises(TypeError):
+        cat2cat_panel(o_old.values, "code", "year", trans, 2010, "backward")
+    with pytest.raises(ValueError):
+        cat2cat_panel(occup, "code", "year", [trans, trans], 2010, "backward")
+    with pytest.raises(ValueError):
+        cat2cat_panel(occup, "code", "year", [trans, trans], [2012, 2010], "backward")
+    with pytest.raises(ValueError):
+        cat2cat_panel(occup, "code", "year", trans, 2020, "backward")
+    with pytest.raises(ValueError):
+        cat2cat_panel(occup, "code", "year", trans, 2010, "wrong")
+    with pytest.raises(ValueError):
+        cat2cat_panel(occup, "code", "year", trans, 2010, "backward", n_jobs=0)
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+@pytest.mark.parametrize("id_var", [None, "id"])
+@pytest.mark.parametrize("split", [dict(), dict(by="district"), dict(chunksize=3000)])
+def test_cat2cat_parallel(direction, id_var, split):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year", id_var=id_var)
+    mappings = cat2cat_mappings(trans, direction)
+    expected = cat2cat(data, mappings)
+    res = cat2cat_parallel(data, mappings, n_jobs=2, **split)
+    for period in ["old", "new"]:
+        assert_frame_equal(res[period], expected[period])
+
+
+def test_cat2cat_parallel_ml():
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    ml = cat2cat_ml(
+        ml_test_data["backward"]["data"],
+        "code",
+        ["salary", "age", "edu", "sex"],
+        [DecisionTreeClassifier(random_state=1234)],
+        fail_warn=False,
+    )
+    expected = cat2cat(data, mappings, ml)
+    res = cat2cat_parallel(data, mappings, ml, n_jobs=2)
+    assert_frame_equal(res["old"], expected["old"])
+
+
+@pytest.mark.parametrize("split", [dict(by="district"), dict(chunksize=3000)])
+def test_cat2cat_parallel_ml_id(split):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year", id_var="id")
+    mappings = cat2cat_mappings(trans, "backward")
+    ml = cat2cat_ml(
+        ml_test_data["backward"]["data"],
+        "code",
+        ["salary", "age", "edu", "sex"],
+        [DecisionTreeClassifier(random_state=1234)],
+        fail_warn=False,
+    )
+    expected = cat2cat(data, mappings, ml)
+    res = cat2cat_parallel(data, mappings, ml, n_jobs=2, **split)
+    for period in ["old", "new"]:
+        assert_frame_equal(res[period], expected[period])
+
+
+def test_cat2cat_parallel_wrong():
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    with pytest.raises(ValueError):
+        cat2cat_parallel(data, mappings, by="wrong")
+    with pytest.raises(ValueError):
+        cat2cat_parallel(data, mappings, chunksize=0)
+    with pytest.raises(ValueError):
+        cat2cat_parallel(data, mappings, n_jobs=0)
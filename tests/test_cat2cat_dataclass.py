@@ -1,6 +1,7 @@
 from cat2cat.datasets import load_trans, load_occup
 
-from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml, cat2cat_spill
+from cat2cat.mappings import get_mapping_index
 from sklearn.ensemble import RandomForestClassifier
 
 from dataclasses import FrozenInstanceError
@@ -68,6 +69,16 @@ def test_cat2cat_mappings():
         mappings.trans = 1
 
 
+def test_cat2cat_mappings_index():
+    index = get_mapping_index(trans)["to_new"]
+    mappings = cat2cat_mappings(index, "backward")
+
+    assert mappings.trans is index
+
+    with pytest.raises(ValueError):
+        cat2cat_mappings(index, "forward")
+
+
 # cat2cat_ml
 def test_cat2cat_ml():
     ml = cat2cat_ml(o_new, "code", ["salary", "age"], [RandomForestClassifier()])
@@ -90,5 +101,31 @@ def test_cat2cat_ml():
     with pytest.raises(TypeError):
         cat2cat_ml(1, "WRONG", ["salary", "age"], [RandomForestClassifier()])
 
+    with pytest.raises(ValueError):
+        cat2cat_ml(o_new, "code", ["salary", "age"], [RandomForestClassifier()], n_jobs=0)
+
+    with pytest.raises(ValueError):
+        cat2cat_ml(o_new, "code", ["salary", "age"], [RandomForestClassifier()], backend="WRONG")
+
     with pytest.raises(FrozenInstanceError):
         ml.data = 1
+
+
+# cat2cat_spill
+def test_cat2cat_spill():
+    spill = cat2cat_spill("scratch")
+
+    assert isinstance(spill, cat2cat_spill)
+    assert not spill.keep
+
+    with pytest.raises(TypeError):
+        cat2cat_spill(1)
+
+    with pytest.raises(TypeError):
+        cat2cat_spill("scratch", keep=1)
+
+    with pytest.raises(ValueError):
+        cat2cat_spill("scratch", chunksize=0)
+
+    with pytest.raises(FrozenInstanceError):
+        spill.path = "other"
@@ -6,8 +6,11 @@ from sklearn.tree import DecisionTreeClassifier
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.naive_bayes import GaussianNB
 from cat2cat.datasets import load_trans, load_occup
+from cat2cat.cat2cat_ml import _group_index
 from numpy.random import seed
-from numpy import isfinite, nan
+from numpy import array, isfinite, isnan, nan
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
 import pytest
 
 trans = load_trans()
@@ -246,3 +249,77 @@ def test_cat2cat_supports_multiple_models_in_one_run():
         col = f"wei_{model_name}_c2c"
         assert col in c2c["old"].columns
         assert c2c["old"].groupby("index_c2c")[col].sum().round(10).eq(1).all()
+
+
+def test_group_index():
+    order, offsets = _group_index(array([2, -1, 0, 2, 0, -1]), 4)
+
+    assert offsets.tolist() == [0, 2, 2, 4, 4]
+    assert order.tolist() == [2, 4, 0, 3]
+
+
+def test_cat2cat_ml_missing_target_category():
+    target = o_old.copy()
+    target.loc[target.index[:10], "code"] = nan
+    ml = cat2cat_ml(o_new, "code", ["salary", "age"], [DecisionTreeClassifier(random_state=1234)])
+    res = cat2cat(
+        cat2cat_data(target, o_new, "code", "code", "year"),
+        cat2cat_mappings(trans, "backward"),
+        ml,
+    )
+    wei = res["old"].groupby("index_c2c")["wei_DecisionTreeClassifier_c2c"].sum()
+
+    assert all(abs(wei - 1) < 1e-6)
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_cat2cat_ml_n_jobs(backend):
+    models = [DecisionTreeClassifier(random_state=1234), GaussianNB()]
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    ml = cat2cat_ml(o_new, "code", ["salary", "age"], models, fail_warn=False)
+    ml_jobs = cat2cat_ml(
+        o_new, "code", ["salary", "age"], models, fail_warn=False, n_jobs=2, backend=backend
+    )
+
+    assert_frame_equal(cat2cat(data, mappings, ml_jobs)["old"], cat2cat(data, mappings, ml)["old"])
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_cat2cat_ml_run_n_jobs(backend):
+    mappings = cat2cat_mappings(trans, "backward")
+    models = [DecisionTreeClassifier(random_state=1234), GaussianNB()]
+    ml = cat2cat_ml(o_new, "code", ["salary", "age"], models)
+    ml_jobs = cat2cat_ml(o_new, "code", ["salary", "age"], models, n_jobs=2, backend=backend)
+
+    res = cat2cat_ml_run(mappings, ml, split_seed=7)
+    res_jobs = cat2cat_ml_run(mappings, ml_jobs, split_seed=7)
+
+    assert_frame_equal(DataFrame(res_jobs.get_raw()), DataFrame(res.get_raw()))
+    assert repr(res_jobs) == repr(res)
+
+
+class CountingTree(DecisionTreeClassifier):
+    fits = 0
+
+    def fit(self, X, y, *args, **kwargs):
+        CountingTree.fits += 1
+        return super().fit(X, y, *args, **kwargs)
+
+
+def test_cat2cat_ml_shared_candidates():
+    trans_s = DataFrame({"old": ["a", "a", "b", "b", "c"], "new": ["x", "y", "x", "y", "z"]})
+    old = DataFrame({"code": ["a", "b", "c", "a"], "f": [1.0, 5.0, 3.0, nan], "year": 2000})
+    new = DataFrame(
+        {"code": ["x", "y", "z"] * 4, "f": [1.0, 5.0, 3.0, 1.5, 5.5, 3.5] * 2, "year": 2001}
+    )
+    CountingTree.fits = 0
+    ml = cat2cat_ml(new, "code", ["f"], [CountingTree(random_state=1234)], on_fail="na", fail_warn=False)
+    res = cat2cat(cat2cat_data(old, new, "code", "code", "year"), cat2cat_mappings(trans_s, "backward"), ml)
+
+    assert CountingTree.fits == 1
+    wei = res["old"].set_index(["index_c2c", "g_new_c2c"])["wei_CountingTree_c2c"]
+    assert wei[(0, "x")] == 1 and wei[(0, "y")] == 0
+    assert wei[(1, "y")] == 1
+    assert wei[(2, "z")] == 1
+    assert isnan(wei[(3, "x")])
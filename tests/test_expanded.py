@@ -0,0 +1,68 @@
+from cat2cat.datasets import load_trans, load_occup, load_verticals
+from cat2cat import cat2cat
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+from cat2cat.expanded import cat2cat_expanded
+from pandas.testing import assert_frame_equal
+from sklearn.tree import DecisionTreeClassifier
+import pytest
+
+occup = load_occup()
+o_old = occup.loc[occup.year == 2008, :].copy()
+o_new = occup.loc[occup.year == 2010, :].copy()
+trans = load_trans()
+verticals = load_verticals()
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+def test_cat2cat_expanded_to_frame(direction):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    ml = cat2cat_ml(
+        o_new, "code", ["salary", "age"], [DecisionTreeClassifier(random_state=1234)]
+    )
+    mappings = cat2cat_mappings(trans, direction)
+    target = "old" if direction == "backward" else "new"
+
+    lazy = cat2cat(data, mappings, ml, output="lazy")
+    eager = cat2cat(data, mappings, ml)
+
+    assert isinstance(lazy[target], cat2cat_expanded)
+    assert lazy[target].shape == eager[target].shape
+    assert lazy[target].columns == list(eager[target].columns)
+    assert_frame_equal(lazy[target].to_frame(), eager[target])
+    base = "new" if target == "old" else "old"
+    assert_frame_equal(lazy[base], eager[base])
+
+
+def test_cat2cat_expanded_direct():
+    vert_old = verticals.loc[verticals["v_date"] == "2020-04-01", :]
+    vert_new = verticals.loc[verticals["v_date"] == "2020-05-01", :]
+    trans_v = (
+        vert_old.merge(vert_new, on="ean", how="inner")
+        .loc[:, ["vertical_x", "vertical_y"]]
+        .drop_duplicates()
+    )
+    data = cat2cat_data(
+        vert_old, vert_new, "vertical", "vertical", "v_date", id_var="ean"
+    )
+    mappings = cat2cat_mappings(trans_v, "backward")
+
+    lazy = cat2cat(data, mappings, output="lazy")["old"]
+    eager = cat2cat(data, mappings)["old"]
+
+    assert len(lazy) == eager.shape[0]
+    assert_frame_equal(lazy.to_frame(), eager)
+    assert_frame_equal(lazy[["ean", "wei_freq_c2c"]], eager[["ean", "wei_freq_c2c"]])
+    assert lazy["wei_freq_c2c"].equals(eager["wei_freq_c2c"])
+
+
+def test_cat2cat_expanded_wrong():
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    lazy = cat2cat(data, mappings, output="lazy")["old"]
+
+    with pytest.raises(KeyError):
+        lazy["WRONG"]
+    with pytest.raises(ValueError):
+        cat2cat(data, mappings, output="WRONG")
+    with pytest.raises(ValueError):
+        cat2cat_expanded(o_old, lazy.rows[:-1], lazy.c2c)
@@ -1,4 +1,15 @@
-from cat2cat.mappings import get_mappings, get_freqs, cat_apply_freq
+from cat2cat.mappings import (
+    get_mappings,
+    get_mapping_index,
+    get_freqs,
+    cat_apply_freq,
+    candidate_probs,
+    compose_mappings,
+    get_mapping_matrix,
+    save_mapping_index,
+    load_mapping_index,
+    MappingIndex,
+)
 from cat2cat.datasets import load_trans, load_occup
 from numpy import array, concatenate, nan
 from numpy.random import choice, seed
@@ -133,6 +144,37 @@ def test_get_freqs_missing_values_with_multiplier():
     assert actual == {"a": 2, None: 3, "b": 1}
 
 
+def test_get_freqs_float_multiplier():
+    actual = get_freqs(array(["a", "b", "a", "c"]), Series([0.5, 2.25, 1.0, 0.0]))
+
+    assert actual == {"a": 1.5, "b": 2.25}
+    assert all(isinstance(v, float) for v in actual.values())
+
+
+def test_get_freqs_multiplier_missing_kinds():
+    actual = get_freqs(["a", None, nan, None, "a"], [1, 2, 3, 4, 5])
+
+    assert actual["a"] == 6
+    assert actual[None] == 6
+    nan_keys = [key for key in actual if isinstance(key, float) and np.isnan(key)]
+    assert len(nan_keys) == 1
+    assert actual[nan_keys[0]] == 3
+
+
+def test_get_freqs_multiplier_same_as_repeat():
+    seed(1234)
+    x = choice(50, 1000, replace=True)
+    multiplier = choice(100, 1000, replace=True)
+    expected = get_freqs(np.repeat(x, multiplier))
+    assert to_python_types(get_freqs(x, multiplier)) == to_python_types(expected)
+
+
+@pytest.mark.parametrize("multiplier", [[1, -1, 1], ["a", "b", "c"]])
+def test_get_freqs_wrong_multiplier(multiplier):
+    with pytest.raises((ValueError, TypeError)):
+        get_freqs([1, 2, 3], multiplier)
+
+
 # get_mappings
 
 
@@ -329,6 +371,63 @@ def test_get_mappings_different_types():
         get_mappings(trans2)
 
 
+def test_get_mappings_mixed_types():
+    x = DataFrame({"o": [1, "2", "3", 4], "n": ["x", "y", "z", "z"]})
+    assert get_mappings(x) == {
+        "to_old": {"x": [1], "y": ["2"], "z": [4, "3"]},
+        "to_new": {1: ["x"], "2": ["y"], "3": ["z"], 4: ["z"]},
+    }
+    assert get_mapping_index(x)["to_old"] == get_mappings(x)["to_old"]
+
+
+# get_mapping_index
+
+
+def test_get_mapping_index_matches_get_mappings():
+    mapps = get_mappings(trans)
+    index = get_mapping_index(trans)
+    for name in ["to_old", "to_new"]:
+        assert isinstance(index[name], MappingIndex)
+        assert index[name] == mapps[name]
+        assert index[name].to_dict() == mapps[name]
+        assert list(index[name].keys()) == list(mapps[name].keys())
+        assert len(index[name]) == len(mapps[name])
+
+
+def test_mapping_index_csr_layout():
+    index = get_mapping_index(array(trans_small))["to_new"]
+    assert list(index.offsets) == [0, 3, 6, 7, 10, 11, 15, 21]
+    assert list(index.lengths) == [3, 3, 1, 3, 1, 4, 6]
+    assert list(index.candidates(2)) == [111402]
+    assert list(index.get_indexer([1112, 9999, 1212])) == [1, -1, 6]
+
+
+def test_mapping_index_dict_like_access():
+    index = get_mapping_index(array(trans_small))["to_old"]
+    assert index[111101] == [1111]
+    assert index.get(999999, []) == []
+    assert 111405 in index
+    assert 999999 not in index
+    with pytest.raises(KeyError):
+        index[999999]
+
+
+def test_mapping_index_nan_key():
+    trans2 = concatenate([trans_small, [[nan, 111101], [1111, nan]]])
+    index = get_mapping_index(trans2)["to_new"]
+    assert index[nan] == [111101.0]
+    assert index.get_indexer(array([nan]))[0] == len(index) - 1
+
+
+def test_mapping_index_caller_arrays_writeable():
+    indices = array([0, 1, 1])
+    offsets = array([0, 2, 3])
+    index = MappingIndex(array(["a", "b"]), array(["x", "y"]), indices, offsets)
+    assert not index.indices.flags.writeable
+    indices[0] = 1
+    assert indices.flags.writeable and offsets.flags.writeable
+
+
 # cat_apply_freq
 
 
@@ -339,3 +438,181 @@ def test_cat_apply_freq():
     )["3417"]
     expected = [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
     assert to_python_types(actual) == expected
+
+
+def test_cat_apply_freq_mapping_index():
+    freqs = get_freqs(occup.code[occup.year == 2010].map(str).to_list())
+    expected = cat_apply_freq(get_mappings(trans)["to_new"], freqs)
+    actual = cat_apply_freq(get_mapping_index(trans)["to_new"], freqs)
+    assert to_python_types(actual) == to_python_types(expected)
+
+
+def test_candidate_probs_flat():
+    mapp = get_mapping_index(array(trans_small))["to_new"]
+    freqs = {111101: 1, 111102: 3, 111201: 2}
+    actual = candidate_probs(mapp, freqs)
+    assert len(actual) == len(mapp.indices)
+    assert list(actual[:3]) == [0.25, 0.75, 0.0]
+    assert list(actual[3:6]) == [1.0, 0.0, 0.0]
+    assert list(actual[6:7]) == [1.0]
+    assert to_python_types(cat_apply_freq(mapp, freqs)) == to_python_types(
+        cat_apply_freq(get_mappings(array(trans_small))["to_new"], freqs)
+    )
+
+
+def test_candidate_probs_aligned_array():
+    mapp = get_mapping_index(array(trans_small))["to_new"]
+    freqs = {111101: 1, 111102: 3, 111201: 2}
+    aligned = array([freqs.get(e, 1e-12) for e in mapp.categories])
+    assert list(candidate_probs(mapp, aligned)) == list(candidate_probs(mapp, freqs))
+    with pytest.raises(ValueError):
+        candidate_probs(mapp, aligned[:-1])
+
+
+# compose_mappings
+
+trans_a = array([["a", "A1"], ["a", "A2"], ["b", "B"], ["c", "C"]])
+trans_b = array([["A1", "x"], ["A2", "y"], ["A2", "z"], ["B", "z"]])
+
+
+def test_compose_mappings_single_table():
+    mapp = compose_mappings([trans], "backward")
+    assert mapp.to_dict() == get_mappings(trans)["to_new"]
+    assert mapp.weights is None
+    assert mapp.direction == "backward"
+
+    freqs = get_freqs(occup.code[occup.year == 2010].map(str).to_list())
+    mapp = compose_mappings([trans], "backward", freqs=[freqs])
+    index = get_mapping_index(trans)["to_new"]
+    assert np.allclose(mapp.weights, candidate_probs(index, freqs), rtol=0, atol=1e-9)
+
+
+def test_compose_mappings_backward():
+    mapp = compose_mappings(
+        [trans_a, trans_b], "backward", freqs=[{"A1": 1, "A2": 3}, None]
+    )
+    # C is a dead end so c is dropped
+    assert mapp.to_dict() == {"a": ["x", "y", "z"], "b": ["z"]}
+    assert list(mapp.weights) == [0.25, 0.375, 0.375, 1.0]
+
+
+def test_compose_mappings_forward():
+    mapp = compose_mappings([trans_a, trans_b], "forward")
+    assert mapp.to_dict() == {"x": ["a"], "y": ["a"], "z": ["a", "b"]}
+    assert mapp.direction == "forward"
+    mapp = compose_mappings(
+        [trans_a, trans_b], "forward", freqs=[{"a": 1, "b": 3}, {"A2": 1, "B": 3}]
+    )
+    assert list(mapp.weights) == [1.0, 1.0, 0.25, 0.75]
+
+
+def test_compose_mappings_zero_probability():
+    # candidates reachable only through a zero frequency are kept
+    mapp = compose_mappings(
+        [trans_a, trans_b], "backward", freqs=[{"A1": 1, "A2": 0}, None]
+    )
+    assert list(mapp.weights) == [1.0, 0.0, 0.0, 1.0]
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ([], "backward", None),
+        ([trans_a, trans_b], "sideways", None),
+        ([trans_a, trans_b], "backward", [None]),
+        ([trans_a, trans_b], "backward", [None, [1, 2]]),
+    ],
+)
+def test_compose_mappings_wrong(args):
+    with pytest.raises((TypeError, ValueError)):
+        compose_mappings(*args)
+
+
+# get_mapping_matrix
+
+
+def test_get_mapping_matrix_dict_and_index():
+    freqs = get_freqs(occup.code[occup.year == 2010].map(str).to_list())
+    mapp = get_mappings(trans)["to_new"]
+    index = get_mapping_index(trans)["to_new"]
+    matrix, rows, cols = get_mapping_matrix(mapp, cat_apply_freq(mapp, freqs))
+    matrix_i, rows_i, cols_i = get_mapping_matrix(index, candidate_probs(index, freqs))
+
+    assert matrix.shape == (len(mapp), len(cols))
+    assert list(rows) == list(rows_i) == list(mapp.keys())
+    # the same matrix up to the order of columns
+    order = Series(range(len(cols)), index=cols)[cols_i].to_numpy()
+    assert (matrix[:, order] != matrix_i).nnz == 0
+    # row stochastic
+    assert np.allclose(matrix.sum(axis=1), 1)
+
+
+def test_get_mapping_matrix_expected_counts():
+    index = get_mapping_index(array(trans_small))["to_new"]
+    freqs = {111101: 1, 111102: 3, 111201: 2}
+    matrix, rows, cols = get_mapping_matrix(index, candidate_probs(index, freqs))
+    counts = np.ones(len(rows))
+    assert np.isclose((counts @ matrix).sum(), len(rows))
+
+    incidence, _, _ = get_mapping_matrix(index)
+    assert list(incidence.sum(axis=1).A1) == list(index.lengths)
+
+
+def test_get_mapping_matrix_wrong():
+    mapp = get_mappings(array(trans_small))["to_new"]
+    with pytest.raises(TypeError):
+        get_mapping_matrix([1, 2])
+    with pytest.raises(ValueError):
+        get_mapping_matrix(mapp, {k: [1.0] for k in mapp})
+    with pytest.raises(ValueError):
+        get_mapping_matrix(get_mapping_index(array(trans_small))["to_new"], array([1.0]))
+
+
+# save_mapping_index and load_mapping_index
+
+
+@pytest.mark.parametrize("table", [trans, array(trans_small)])
+def test_save_load_mapping_index(tmp_path, table):
+    index = get_mapping_index(table)["to_old"]
+    save_mapping_index(index, tmp_path / "mapp")
+    loaded = load_mapping_index(tmp_path / "mapp")
+
+    assert isinstance(loaded.indices, np.memmap)
+    assert loaded.to_dict() == index.to_dict()
+    assert loaded.direction == "forward"
+    assert loaded.fingerprint == index.fingerprint
+    assert loaded.weights is None
+    assert list(loaded.get_indexer(index.key_labels)) == list(range(len(index)))
+
+    loaded = load_mapping_index(tmp_path / "mapp", mmap=False)
+    assert not isinstance(loaded.indices, np.memmap)
+    assert loaded.to_dict() == index.to_dict()
+
+
+def test_save_mapping_index_freqs(tmp_path):
+    index = get_mapping_index(array(trans_small))["to_new"]
+    freqs = {111101: 1, 111102: 3, 111201: 2}
+    save_mapping_index(index, tmp_path / "mapp", freqs=freqs)
+    loaded = load_mapping_index(tmp_path / "mapp")
+    assert list(loaded.weights) == list(candidate_probs(index, freqs))
+
+
+def test_load_mapping_index_wrong(tmp_path):
+    save_mapping_index(get_mapping_index(trans)["to_new"], tmp_path / "mapp")
+    meta = (tmp_path / "mapp" / "meta.json").read_text()
+    (tmp_path / "mapp" / "meta.json").write_text(meta.replace('"version": 1', '"version": 99'))
+    with pytest.raises(ValueError):
+        load_mapping_index(tmp_path / "mapp")
+    with pytest.raises(FileNotFoundError):
+        load_mapping_index(tmp_path / "missing")
+
+
+def test_save_mapping_index_mixed_labels(tmp_path):
+    index = MappingIndex(
+        key_labels=array(["a", 1], dtype=object),
+        categories=array(["x"], dtype=object),
+        indices=array([0, 0]),
+        offsets=array([0, 1, 2]),
+    )
+    with pytest.raises(ValueError):
+        save_mapping_index(index, tmp_path / "mapp")
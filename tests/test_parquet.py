@@ -0,0 +1,102 @@
+from cat2cat.datasets import load_trans, load_occup
+from cat2cat import cat2cat
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings
+from pandas import read_parquet
+from pandas.testing import assert_frame_equal
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds  # noqa: E402
+import pyarrow.feather as feather  # noqa: E402
+
+from cat2cat.parquet import cat2cat_parquet  # noqa: E402
+
+trans = load_trans()
+occup = load_occup(small=True)
+o_old = occup.loc[occup.year == 2008, :].reset_index(drop=True)
+o_new = occup.loc[occup.year == 2010, :].reset_index(drop=True)
+
+
+def sorted_frame(df):
+    return df.sort_values("index_c2c", kind="stable").reset_index(drop=True)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    o_old.to_parquet(tmp_path / "old.parquet")
+    o_new.to_parquet(tmp_path / "new.parquet")
+    return str(tmp_path / "old.parquet"), str(tmp_path / "new.parquet")
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+@pytest.mark.parametrize("id_var", [None, "id"])
+def test_cat2cat_parquet(paths, tmp_path, direction, id_var):
+    mappings = cat2cat_mappings(trans, direction)
+    res = cat2cat_parquet(
+        *paths, str(tmp_path / "out"), mappings, "code", "code", "year",
+        id_var=id_var, batch_size=500,
+    )
+    expected = cat2cat(
+        cat2cat_data(o_old, o_new, "code", "code", "year", id_var=id_var),
+        mappings,
+        categorical=True,
+    )
+    for period in ["old", "new"]:
+        got = read_parquet(res[period])
+        assert got["g_new_c2c"].dtype == "category"
+        assert list(got.columns) == list(expected[period].columns)
+        assert_frame_equal(
+            sorted_frame(got),
+            sorted_frame(expected[period]),
+            check_dtype=False,
+            check_categorical=False,
+            check_column_type=False,
+        )
+
+
+def test_cat2cat_parquet_dictionary(paths, tmp_path):
+    res = cat2cat_parquet(
+        *paths, str(tmp_path / "out"), cat2cat_mappings(trans, "backward"),
+        "code", "code", "year", batch_size=500,
+    )
+    dataset = ds.dataset(res["old"])
+    assert len(dataset.files) > 1
+    assert pa.types.is_dictionary(dataset.schema.field("g_new_c2c").type)
+
+
+def test_cat2cat_parquet_rerun(paths, tmp_path):
+    mappings = cat2cat_mappings(trans, "backward")
+    args = (*paths, str(tmp_path / "out"), mappings, "code", "code", "year")
+    cat2cat_parquet(*args, batch_size=500)
+    res = cat2cat_parquet(*args, batch_size=len(o_old) + len(o_new))
+    assert len(ds.dataset(res["old"]).files) == 1
+    expected = cat2cat(cat2cat_data(o_old, o_new, "code", "code", "year"), mappings)
+    assert read_parquet(res["old"]).shape[0] == expected["old"].shape[0]
+
+
+def test_cat2cat_parquet_arrow(tmp_path):
+    feather.write_feather(pa.Table.from_pandas(o_old), str(tmp_path / "old.arrow"))
+    feather.write_feather(pa.Table.from_pandas(o_new), str(tmp_path / "new.arrow"))
+    res = cat2cat_parquet(
+        str(tmp_path / "old.arrow"), str(tmp_path / "new.arrow"), str(tmp_path / "out"),
+        cat2cat_mappings(trans, "forward"), "code", "code", "year", input_format="arrow",
+    )
+    assert read_parquet(res["new"]).shape[0] == cat2cat(
+        cat2cat_data(o_old, o_new, "code", "code", "year"),
+        cat2cat_mappings(trans, "forward"),
+    )["new"].shape[0]
+
+
+def test_cat2cat_parquet_wrong(paths, tmp_path):
+    with pytest.raises(TypeError):
+        cat2cat_parquet(*paths, str(tmp_path / "out"), trans, "code", "code", "year")
+    with pytest.raises(ValueError):
+        cat2cat_parquet(
+            *paths, str(tmp_path / "out"), cat2cat_mappings(trans, "backward"),
+            "code", "code", "year", batch_size=0,
+        )
+    with pytest.raises(ValueError):
+        cat2cat_parquet(
+            *paths, str(tmp_path / "out"), cat2cat_mappings(trans, "backward"),
+            "wrong", "code", "year",
+        )
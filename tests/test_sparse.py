@@ -0,0 +1,81 @@
+from cat2cat.datasets import load_trans, load_occup
+from cat2cat import cat2cat
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_ml
+from cat2cat.sparse import cat2cat_sparse
+from numpy import allclose, asarray
+from pandas import DataFrame, Index
+from pandas.testing import assert_frame_equal
+from scipy.sparse import csr_matrix
+from sklearn.tree import DecisionTreeClassifier
+import pytest
+
+occup = load_occup(small=True)
+o_old = occup.loc[occup.year == 2008, :].copy()
+o_new = occup.loc[occup.year == 2010, :].copy()
+trans = load_trans()
+
+
+def to_matrix(frame, res, name):
+    cols = Index(res.categories).get_indexer(frame["g_new_c2c"].astype(object))
+    return csr_matrix(
+        (frame[name].to_numpy(dtype=float), (frame["index_c2c"].to_numpy(), cols)),
+        shape=res.shape,
+    )
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+@pytest.mark.parametrize("id_var", [None, "id"])
+@pytest.mark.parametrize("categorical", [False, True])
+def test_cat2cat_sparse(direction, id_var, categorical):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year", id_var=id_var)
+    mappings = cat2cat_mappings(trans, direction)
+    target = "old" if direction == "backward" else "new"
+    base = "new" if target == "old" else "old"
+
+    res = cat2cat(data, mappings, categorical=categorical, output="sparse")
+    eager = cat2cat(data, mappings, categorical=categorical)
+
+    assert isinstance(res[target], cat2cat_sparse)
+    assert res[target].data is getattr(data, target)
+    assert res[target].names == ["wei_naive_c2c", "wei_freq_c2c"]
+    for name in res[target].names:
+        assert abs(res[target][name] - to_matrix(eager[target], res[target], name)).max() < 1e-9
+    found = res[target].rep > 0
+    assert allclose(asarray(res[target]["wei_freq_c2c"].sum(axis=1)).ravel()[found], 1)
+    assert_frame_equal(res[base], eager[base])
+
+
+def test_cat2cat_sparse_ml():
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    ml = cat2cat_ml(
+        o_new, "code", ["salary", "age"], [DecisionTreeClassifier(random_state=1234)]
+    )
+    mappings = cat2cat_mappings(trans, "backward")
+
+    res = cat2cat(data, mappings, ml, output="sparse")
+    eager = cat2cat(data, mappings, ml)
+
+    assert res["old"].names[-1] == "wei_DecisionTreeClassifier_c2c"
+    for name in res["old"].names:
+        assert abs(res["old"][name] - to_matrix(eager["old"], res["old"], name)).max() < 1e-9
+
+
+def test_cat2cat_sparse_direct():
+    trans_s = DataFrame({"old": ["a", "a", "b"], "new": ["x", "y", "y"]})
+    old = DataFrame({"id": [1, 2, 3], "code": ["a", "b", "a"], "year": 2000})
+    new = DataFrame({"id": [1, 2, 5], "code": ["z", "x", "y"], "year": 2001})
+    data = cat2cat_data(old, new, "code", "code", "year", id_var="id")
+
+    res = cat2cat(data, cat2cat_mappings(trans_s, "backward"), output="sparse")
+
+    assert res["old"].categories.tolist() == ["x", "y", "z"]
+    assert res["old"]["wei_freq_c2c"].toarray().tolist() == [[0, 0, 1], [1, 0, 0], [0.5, 0.5, 0]]
+    assert res["old"].rep.tolist() == [1, 1, 2]
+
+
+def test_cat2cat_sparse_wrong():
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    with pytest.raises(ValueError):
+        cat2cat(data, cat2cat_mappings(trans, "backward"), output="WRONG")
+    with pytest.raises(ValueError):
+        cat2cat_sparse(o_old, {"wei_freq_c2c": csr_matrix((1, 1))}, asarray(["a"]))
@@ -0,0 +1,69 @@
+from cat2cat.datasets import load_trans, load_occup
+from cat2cat import cat2cat
+from cat2cat.dataclass import cat2cat_data, cat2cat_mappings, cat2cat_spill
+from cat2cat.spill import load_spill
+from numpy import memmap
+from pandas.testing import assert_frame_equal
+import os
+import pytest
+
+trans = load_trans()
+occup = load_occup(small=True)
+o_old = occup.loc[occup.year == 2008, :].copy()
+o_new = occup.loc[occup.year == 2010, :].copy()
+
+
+def is_mapped(x):
+    while x is not None:
+        if isinstance(x, memmap):
+            return True
+        x = x.base
+    return False
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward"])
+@pytest.mark.parametrize("id_var", [None, "id"])
+@pytest.mark.parametrize("categorical", [False, True])
+def test_cat2cat_spill(tmp_path, direction, id_var, categorical):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year", id_var=id_var)
+    mappings = cat2cat_mappings(trans, direction)
+    target = "old" if direction == "backward" else "new"
+    expected = cat2cat(data, mappings, categorical=categorical)
+
+    path = str(tmp_path / "scratch")
+    res = cat2cat(data, mappings, categorical=categorical, spill=cat2cat_spill(path, chunksize=100))
+    assert_frame_equal(res["old"], expected["old"])
+    assert_frame_equal(res["new"], expected["new"])
+    assert is_mapped(res[target]["salary"].to_numpy())
+    assert os.listdir(path) == []
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_cat2cat_spill_keep(tmp_path, categorical):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year", id_var="id")
+    mappings = cat2cat_mappings(trans, "backward")
+    expected = cat2cat(data, mappings, categorical=categorical)["old"]
+
+    path = str(tmp_path / "scratch")
+    cat2cat(data, mappings, categorical=categorical, spill=cat2cat_spill(path, keep=True))
+    assert "meta.json" in os.listdir(path)
+    assert_frame_equal(load_spill(path), expected)
+    assert is_mapped(load_spill(path)["index_c2c"].to_numpy())
+    assert_frame_equal(load_spill(path, mmap=False), expected)
+
+
+def test_cat2cat_spill_lazy(tmp_path):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    res = cat2cat(data, cat2cat_mappings(trans, "backward"), output="lazy")
+    assert_frame_equal(res["old"].spill(str(tmp_path)), res["old"].to_frame())
+
+
+def test_cat2cat_spill_wrong(tmp_path):
+    data = cat2cat_data(o_old, o_new, "code", "code", "year")
+    mappings = cat2cat_mappings(trans, "backward")
+    with pytest.raises(TypeError):
+        cat2cat(data, mappings, spill=str(tmp_path))
+    with pytest.raises(ValueError):
+        cat2cat(data, mappings, output="lazy", spill=cat2cat_spill(str(tmp_path)))
+    with pytest.raises(FileNotFoundError):
+        load_spill(str(tmp_path / "missing"))